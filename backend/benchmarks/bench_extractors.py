@@ -0,0 +1,126 @@
+# bench_extractors.py
+
+"""
+Benchmark: Trustcall extractor overhead per call, and cold vs warm first job.
+
+1. Per call: building the ToDo extractor with a run-tree Spy on every call
+   (the old update_todos) versus the prebuilt extractor with a per-call
+   ToolCallCapture callback. Both use a local fake chat model, so only the
+   overhead is measured, not the LLM.
+2. First job: importing the agent and running warmup() in a fresh process.
+   This is what every job paid under `rq worker`, which imports the job
+   module in each forked work-horse. `python worker.py` pays it once.
+
+Usage, from backend/ with the worker's environment (POSTGRES_URL, Redis):
+
+    python benchmarks/bench_extractors.py
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from trustcall import create_extractor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import ToDo, ToolCallCapture, extract_tool_info  # noqa: E402
+
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 50))
+COLD_ROUNDS = int(os.getenv("BENCH_COLD_ROUNDS", 3))
+
+
+class FakeToolModel(BaseChatModel):
+    """Answers every call with one new ToDo"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-model"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_call = {
+            "name": "ToDo",
+            "args": {"task": "Buy milk", "time_to_complete": 10, "deadline": None,
+                     "solutions": ["Go to the shop"], "status": "not started"},
+            "id": "call-1",
+        }
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="", tool_calls=[tool_call]))])
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(**kwargs)
+
+
+# The per-call Spy update_todos used to build
+class Spy:
+    def __init__(self):
+        self.called_tools = []
+
+    def __call__(self, run):
+        q = [run]
+        while q:
+            r = q.pop()
+            if r.child_runs:
+                q.extend(r.child_runs)
+            if r.run_type == "chat_model":
+                self.called_tools.append(
+                    r.outputs["generations"][0][0]["message"]["kwargs"]["tool_calls"]
+                )
+
+
+MESSAGES = [SystemMessage(content="Reflect on following interaction."), HumanMessage(content="I need to buy milk")]
+
+
+def rebuilt_per_call(model):
+    spy = Spy()
+    extractor = create_extractor(model, tools=[ToDo], tool_choice="ToDo", enable_inserts=True).with_listeners(on_end=spy)
+    extractor.invoke({"messages": MESSAGES, "existing": None})
+    return extract_tool_info(spy.called_tools, "ToDo")
+
+
+def prebuilt(extractor):
+    capture = ToolCallCapture()
+    extractor.invoke({"messages": MESSAGES, "existing": None}, {"callbacks": [capture]})
+    return extract_tool_info(capture.called_tools, "ToDo")
+
+
+def timed(fn, *args, rounds=ROUNDS):
+    fn(*args)  # warm up
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def cold_start_ms():
+    code = "import time; t = time.perf_counter(); import agent; agent.warmup(); print((time.perf_counter() - t) * 1000)"
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    for _ in range(COLD_ROUNDS):
+        out = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def main():
+    model = FakeToolModel()
+    extractor = create_extractor(model, tools=[ToDo], tool_choice="ToDo", enable_inserts=True)
+    assert rebuilt_per_call(model) == prebuilt(extractor)
+
+    rebuilt = timed(rebuilt_per_call, model)
+    reused = timed(prebuilt, extractor)
+    print(f"extractor call, rebuilt with Spy:   {rebuilt:8.2f} ms")
+    print(f"extractor call, prebuilt + capture: {reused:8.2f} ms  ({rebuilt / reused:.1f}x)")
+
+    cold = cold_start_ms()
+    print(f"cold start (import agent + warmup): {cold:8.2f} ms  (paid per job by forking workers, once by python worker.py)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# bench_server_startup.py
+
+"""
+Benchmark and guard: API server cold start.
+
+1. Import time: `python -X importtime -c "import server"` in a fresh
+   process. Prints the total and the slowest top-level imports, and fails
+   if the server pulls in the agent's dependencies (LangGraph, Trustcall,
+   the model clients), which belong to the workers.
+2. First request: a fresh process imports the server, starts it (lifespan)
+   and serves one POST /todos/get.
+
+Exits non-zero if the agent's modules are imported or either time is over
+its budget, so it can run as a check before deploying.
+
+Usage, from backend/ with the server's environment (POSTGRES_URL, Redis):
+
+    python benchmarks/bench_server_startup.py
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUNDS = int(os.getenv("BENCH_COLD_ROUNDS", 3))
+TOP_IMPORTS = 10
+SERVER_IMPORT_BUDGET_MS = float(os.getenv("SERVER_IMPORT_BUDGET_MS", 1500))
+FIRST_REQUEST_BUDGET_MS = float(os.getenv("FIRST_REQUEST_BUDGET_MS", 3000))
+
+# Worker-only modules the server must not import
+FORBIDDEN = ("agent", "langgraph", "trustcall", "langchain_google_genai", "langchain_ollama")
+
+FIRST_REQUEST = """
+import time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+import server
+with TestClient(server.app) as client:
+    response = client.post("/todos/get", json={"user_id": "__bench__"})
+    response.raise_for_status()
+    print((time.perf_counter() - started) * 1000)
+"""
+
+
+def import_times():
+    """[(module, cumulative_us, depth)] for `import server` in a fresh process, in report order"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"],
+                         cwd=BACKEND, capture_output=True, text=True, check=True)
+    modules = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            _, cumulative_us, name = line.split(":", 1)[1].split("|")
+            cumulative_us = int(cumulative_us)
+        except ValueError:
+            continue  # the header line
+        # One space after the separator, then two per nesting level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), cumulative_us, depth))
+    return modules
+
+
+def server_imports(modules):
+    """Modules imported by `import server`: the entries reported before it, up to the previous top-level one"""
+    end = next(i for i, (name, _, depth) in enumerate(modules) if name == "server" and depth == 0)
+    start = end
+    while start > 0 and modules[start - 1][2] > 0:
+        start -= 1
+    return modules[end][1], modules[start:end]
+
+
+def first_request_ms():
+    samples = []
+    for _ in range(ROUNDS):
+        out = subprocess.run([sys.executable, "-c", FIRST_REQUEST], cwd=BACKEND,
+                             capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def main():
+    failures = []
+
+    total_us, imported = server_imports(import_times())
+    total_ms = total_us / 1000
+    print(f"import server: {total_ms:8.1f} ms  (budget {SERVER_IMPORT_BUDGET_MS:.0f} ms)")
+    # Direct imports of the server, slowest first
+    direct = sorted(((cumulative_us, name) for name, cumulative_us, depth in imported if depth == 1), reverse=True)
+    for cumulative_us, name in direct[:TOP_IMPORTS]:
+        print(f"  {name:<40} {cumulative_us / 1000:8.1f} ms")
+    if total_ms > SERVER_IMPORT_BUDGET_MS:
+        failures.append(f"import server took {total_ms:.0f} ms")
+
+    forbidden = sorted({name for name, _, _ in imported if name.split(".")[0] in FORBIDDEN})
+    if forbidden:
+        failures.append(f"server imports worker-only modules: {', '.join(forbidden[:5])}")
+
+    first = first_request_ms()
+    print(f"first /todos/get from a cold process: {first:8.1f} ms  (budget {FIRST_REQUEST_BUDGET_MS:.0f} ms)")
+    if first > FIRST_REQUEST_BUDGET_MS:
+        failures.append(f"first request took {first:.0f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# bench_sql_store.py
+
+"""
+Benchmark: todo writes per second through db/sql_store.py, for 1 to 10k
+todos, with the old per-item put (SELECT, session.merge, commit on a new
+session per call) versus PostgresStore.put_many (one transaction of
+batched INSERT ... ON CONFLICT DO UPDATE). Both insert fresh todos, then
+update them.
+
+Usage, from backend/:
+
+    POSTGRES_URL=postgresql://... python benchmarks/bench_sql_store.py
+
+Writes throwaway users `bench-sql-<n>` and deletes them after.
+"""
+
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.db import engine, get_session, session_scope  # noqa: E402
+from db.models import Base, ToDo  # noqa: E402
+from db.sql_store import PostgresStore  # noqa: E402
+
+TODO_COUNTS = (1, 10, 100, 1000, 10000)
+# The per-item baseline is skipped above this many todos
+LEGACY_MAX_TODOS = int(os.getenv("BENCH_LEGACY_MAX_TODOS", 10000))
+
+
+# The old PostgresStore.put for todos
+def legacy_put(namespace, key, value):
+    session = get_session()
+    kind, user_id = namespace
+    obj = session.query(ToDo).filter_by(id=key).one_or_none()
+    if obj is None:
+        obj = ToDo(id=key, user_id=user_id)
+    for k, v in value.items():
+        setattr(obj, k, v)
+    session.merge(obj)
+    session.commit()
+    session.close()
+
+
+def todos(n: int, status: str):
+    return {
+        str(uuid.uuid4()): {
+            "task": f"Task number {i}",
+            "time_to_complete": 30,
+            "deadline": "2026-12-31T18:00:00",
+            "solutions": ["do it", "then check it"],
+            "status": status,
+        }
+        for i in range(n)
+    }
+
+
+def cleanup(user_id: str):
+    with session_scope() as session:
+        session.query(ToDo).filter_by(user_id=user_id).delete()
+
+
+def writes_per_s(write, user_id: str, items: dict):
+    """Rate of inserting `items`, then of updating all of them"""
+    start = time.perf_counter()
+    write(user_id, items)
+    inserted = time.perf_counter() - start
+    updates = {key: {**value, "status": "done"} for key, value in items.items()}
+    start = time.perf_counter()
+    write(user_id, updates)
+    updated = time.perf_counter() - start
+    return len(items) / inserted, len(items) / updated
+
+
+def per_item(user_id: str, items: dict):
+    for key, value in items.items():
+        legacy_put(("todo", user_id), key, value)
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    store = PostgresStore()
+
+    def bulk(user_id: str, items: dict):
+        store.put_many(("todo", user_id), items)
+
+    print(f"{'todos':>6} {'put insert/s':>13} {'put update/s':>13} {'put_many insert/s':>18} {'put_many update/s':>18}")
+    for n in TODO_COUNTS:
+        user_id = f"bench-sql-{n}"
+        cleanup(user_id)
+        try:
+            if n <= LEGACY_MAX_TODOS:
+                legacy = writes_per_s(per_item, user_id, todos(n, "not started"))
+            else:
+                legacy = (float("nan"), float("nan"))
+            cleanup(user_id)
+            batched = writes_per_s(bulk, user_id, todos(n, "not started"))
+            assert sum(1 for _ in store.iter_search(("todo", user_id), columns=["id"])) == n
+            print(f"{n:>6} {legacy[0]:>13.0f} {legacy[1]:>13.0f} {batched[0]:>18.0f} {batched[1]:>18.0f}")
+        finally:
+            cleanup(user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# checkpointer.py
+
+"""
+Within-thread memory (LangGraph checkpointer) shared by all workers.
+
+CHECKPOINTER selects the backend:
+- "postgres" (default): PostgresSaver on the agent's Postgres database, so
+  thread history survives work-horse exits and is visible to every worker
+- "memory": in-process MemorySaver, only useful for local experiments
+
+Postgres checkpoints are kept bounded by compact_thread(), which the worker
+runs after every job, and sweep_expired_threads(), which drops threads that
+have been idle for longer than the retention period.
+"""
+
+import os
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.postgres import PostgresSaver
+from psycopg.rows import tuple_row
+
+from db.pool import borrow_connection
+
+CHECKPOINTER = os.getenv("CHECKPOINTER", "postgres")
+# Checkpoints kept per thread (and namespace) after compaction
+CHECKPOINT_KEEP_PER_THREAD = int(os.getenv("CHECKPOINT_KEEP_PER_THREAD", 5))
+# Threads whose stored checkpoints exceed this are compacted to the latest one
+CHECKPOINT_MAX_THREAD_BYTES = int(os.getenv("CHECKPOINT_MAX_THREAD_BYTES", 2 * 1024 * 1024))
+# Threads idle for longer than this are deleted by the sweep
+CHECKPOINT_RETENTION_DAYS = float(os.getenv("CHECKPOINT_RETENTION_DAYS", 30))
+
+
+def build_checkpointer(conn):
+    """Create the configured checkpointer on the given psycopg connection or pool"""
+    if CHECKPOINTER == "postgres":
+        return PostgresSaver(conn)
+    if CHECKPOINTER == "memory":
+        return MemorySaver()
+    raise ValueError(f"Unknown CHECKPOINTER: {CHECKPOINTER}")
+
+
+# Deletes every checkpoint of a thread except the newest `keep` per namespace.
+# checkpoint_id is a time-ordered UUIDv6, so it sorts by creation time.
+_DELETE_OLD_CHECKPOINTS = """
+DELETE FROM checkpoints c
+USING (
+    SELECT checkpoint_ns, checkpoint_id,
+           row_number() OVER (PARTITION BY checkpoint_ns ORDER BY checkpoint_id DESC) AS rn
+    FROM checkpoints
+    WHERE thread_id = %(thread_id)s
+) ranked
+WHERE c.thread_id = %(thread_id)s
+  AND c.checkpoint_ns = ranked.checkpoint_ns
+  AND c.checkpoint_id = ranked.checkpoint_id
+  AND ranked.rn > %(keep)s
+"""
+
+_DELETE_ORPHAN_WRITES = """
+DELETE FROM checkpoint_writes w
+WHERE w.thread_id = %(thread_id)s
+  AND NOT EXISTS (
+    SELECT 1 FROM checkpoints c
+    WHERE c.thread_id = w.thread_id
+      AND c.checkpoint_ns = w.checkpoint_ns
+      AND c.checkpoint_id = w.checkpoint_id
+  )
+"""
+
+# Blobs hold channel values by version; drop versions no checkpoint points to
+_DELETE_ORPHAN_BLOBS = """
+DELETE FROM checkpoint_blobs b
+WHERE b.thread_id = %(thread_id)s
+  AND NOT EXISTS (
+    SELECT 1 FROM checkpoints c
+    WHERE c.thread_id = b.thread_id
+      AND c.checkpoint_ns = b.checkpoint_ns
+      AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+  )
+"""
+
+_THREAD_SIZE = """
+SELECT coalesce(sum(octet_length(blob)), 0) AS size
+FROM checkpoint_blobs
+WHERE thread_id = %(thread_id)s
+"""
+
+_EXPIRED_THREADS = """
+SELECT thread_id
+FROM checkpoints
+GROUP BY thread_id
+HAVING max((checkpoint ->> 'ts')::timestamptz) < now() - make_interval(secs => %(retention_s)s)
+"""
+
+
+def compact_thread(checkpointer, thread_id: str, keep: int = CHECKPOINT_KEEP_PER_THREAD):
+    """
+    Drop all but the newest `keep` checkpoints of a thread, plus the writes
+    and blobs only they referenced. Threads over CHECKPOINT_MAX_THREAD_BYTES
+    are compacted down to their latest checkpoint. Returns the thread's
+    stored blob size in bytes after compaction.
+    """
+    if not isinstance(checkpointer, PostgresSaver):
+        return None
+
+    params = {"thread_id": str(thread_id), "keep": keep}
+    with borrow_connection(checkpointer) as conn, conn.transaction(), conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute(_THREAD_SIZE, params)
+        if cur.fetchone()[0] > CHECKPOINT_MAX_THREAD_BYTES:
+            params["keep"] = 1
+        cur.execute(_DELETE_OLD_CHECKPOINTS, params)
+        cur.execute(_DELETE_ORPHAN_WRITES, params)
+        cur.execute(_DELETE_ORPHAN_BLOBS, params)
+        cur.execute(_THREAD_SIZE, params)
+        return cur.fetchone()[0]
+
+
+def sweep_expired_threads(checkpointer, retention_days: float = CHECKPOINT_RETENTION_DAYS):
+    """Delete every thread idle for longer than the retention period"""
+    if not isinstance(checkpointer, PostgresSaver):
+        return 0
+
+    with borrow_connection(checkpointer) as conn, conn.transaction(), conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute(_EXPIRED_THREADS, {"retention_s": retention_days * 86400})
+        thread_ids = [row[0] for row in cur.fetchall()]
+        if thread_ids:
+            for table in ("checkpoint_writes", "checkpoint_blobs", "checkpoints"):
+                cur.execute(f"DELETE FROM {table} WHERE thread_id = ANY(%s)", (thread_ids,))
+        return len(thread_ids)
@@ -1,8 +1,23 @@
-from models import Base
-from db import engine
+# Run from backend/: python -m db.migrate
+
+from db.models import Base
+from db.db import engine
 Base.metadata.create_all(bind=engine)
 print("SQLAlchemy models created (metadata.create_all)")
 
-from ..agent import across_thread_memory
+from storage import get_store, get_checkpointer
+across_thread_memory = get_store()
+within_thread_memory = get_checkpointer()
 across_thread_memory.setup()
-print("PostgresStore setup completed")
\ No newline at end of file
+print("PostgresStore setup completed")
+
+# Indexes for /todos/get on the store table (see todo_query.py)
+from todo_query import setup_todo_indexes
+with across_thread_memory.conn.connection() as conn:
+    setup_todo_indexes(conn)
+print("ToDo indexes created")
+
+# Creates the checkpoint tables when CHECKPOINTER=postgres
+if hasattr(within_thread_memory, "setup"):
+    within_thread_memory.setup()
+    print("Checkpointer setup completed")
\ No newline at end of file
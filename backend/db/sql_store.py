@@ -1,57 +1,109 @@
-from models import UserProfile, ToDo, Instructions
-from db import get_session
-import uuid
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from db.models import UserProfile, ToDo, Instructions
+from db.db import session_scope
+
+# Rows fetched per round trip when streaming search results
+SEARCH_BATCH_SIZE = 1000
+
+# Table and primary key column for each namespace kind. Profiles and
+# instructions are one row per user, so their key is the user_id.
+TABLES = {
+    "profile": (UserProfile, "user_id"),
+    "todo": (ToDo, "id"),
+    "instructions": (Instructions, "user_id"),
+}
+
+def _table(kind):
+    if kind not in TABLES:
+        raise ValueError(f"Unknown memory kind: {kind}")
+    return TABLES[kind]
+
+def _row(kind, user_id, key, value):
+    """Columns to write for one memory; fields the table does not have are dropped"""
+    model, pk = _table(kind)
+    if kind == "instructions":
+        return {"user_id": user_id, "instructions": value.get("instructions", value.get("memory", ""))}
+    row = {k: v for k, v in value.items() if k in model.__table__.columns and k not in ("id", "user_id")}
+    row["user_id"] = user_id
+    row[pk] = user_id if pk == "user_id" else key
+    return row
 
 class PostgresStore:
-    def search(self, namespace):
-        session = get_session()
+    def search(self, namespace, columns=None):
+        """A user's memories of one kind, as a list (see iter_search)"""
+        return list(self.iter_search(namespace, columns=columns))
+
+    def iter_search(self, namespace, columns=None, batch_size=SEARCH_BATCH_SIZE):
+        """
+        Stream a user's memories of one kind. Yields ORM objects, or just the
+        given columns as row mappings when `columns` is set. The session is
+        open while iterating and closed when the iterator is exhausted or closed.
+        """
         kind, user_id = namespace
-        if kind == "profile":
-            result = session.query(UserProfile).filter_by(user_id=user_id).all()
-        elif kind == "todo":
-            result = session.query(ToDo).filter_by(user_id=user_id).all()
-        elif kind == "instructions":
-            result = session.query(Instructions).filter_by(user_id=user_id).all()
+        if kind not in TABLES:
+            return
+        model, _ = TABLES[kind]
+        if columns:
+            stmt = select(*(model.__table__.columns[c] for c in columns))
         else:
-            result = []
-        session.close()
-        return result
+            stmt = select(model)
+        stmt = stmt.where(model.user_id == user_id).execution_options(yield_per=batch_size)
+        with session_scope() as session:
+            result = session.execute(stmt)
+            yield from (result.mappings() if columns else result.scalars())
 
     def put(self, namespace, key, value):
-        session = get_session()
+        self.put_many(namespace, {key: value})
+
+    def put_many(self, namespace, items):
+        """
+        Upsert {key: value} memories in one transaction with INSERT ... ON
+        CONFLICT DO UPDATE. Only the fields present in a value are updated,
+        and a key that belongs to another user is left as it is.
+        """
         kind, user_id = namespace
-        if kind == "profile":
-            obj = session.query(UserProfile).filter_by(user_id=user_id).one_or_none()
-            if obj is None:
-                obj = UserProfile(user_id=user_id)
-            # value is expected as json/dict, update fields
-            for k, v in value.items():
-                setattr(obj, k, v)
-            session.merge(obj)
-        elif kind == "todo":
-            obj = session.query(ToDo).filter_by(id=key).one_or_none()
-            if obj is None:
-                obj = ToDo(id=key, user_id=user_id)
-            for k, v in value.items():
-                setattr(obj, k, v)
-            session.merge(obj)
-        elif kind == "instructions":
-            obj = session.query(Instructions).filter_by(user_id=user_id).one_or_none()
-            if obj is None:
-                obj = Instructions(user_id=user_id)
-            obj.instructions = value.get("memory", "")
-            session.merge(obj)
-        session.commit()
-        session.close()
+        model, pk = _table(kind)
+        # One row per primary key (the last value wins), grouped by the
+        # columns they set so each group is a single batched statement
+        rows = {}
+        for key, value in items.items():
+            row = _row(kind, user_id, key, value)
+            rows[row[pk]] = {**rows.get(row[pk], {}), **row}
+        groups = {}
+        for row in rows.values():
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        with session_scope() as session:
+            for columns, group in groups.items():
+                stmt = insert(model)
+                # Rows never change owner
+                updates = {c: stmt.excluded[c] for c in columns if c not in (pk, "user_id")}
+                if updates:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[pk], set_=updates,
+                        where=model.user_id == stmt.excluded.user_id
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=[pk])
+                session.execute(stmt, group)
 
     def get(self, namespace, key):
-        session = get_session()
+        return self.get_many(namespace, [key]).get(key)
+
+    def get_many(self, namespace, keys):
+        """{key: ORM object} for the given keys that exist, in one query"""
         kind, user_id = namespace
-        if kind == "profile":
-            return session.query(UserProfile).filter_by(user_id=user_id).one_or_none()
-        elif kind == "todo":
-            return session.query(ToDo).filter_by(id=key).one_or_none()
-        elif kind == "instructions":
-            return session.query(Instructions).filter_by(user_id=user_id).one_or_none()
-        else:
-            return None
+        if kind not in TABLES:
+            return {}
+        model, pk = TABLES[kind]
+        if pk == "user_id":
+            # One row per user: every key maps to it
+            with session_scope() as session:
+                obj = session.get(model, user_id)
+            return {key: obj for key in keys} if obj is not None else {}
+        with session_scope() as session:
+            objs = session.scalars(
+                select(model).where(model.user_id == user_id, getattr(model, pk).in_(list(keys)))
+            ).all()
+        return {getattr(obj, pk): obj for obj in objs}
@@ -0,0 +1,74 @@
+# job_notifier.py
+
+import asyncio
+import json
+from contextlib import asynccontextmanager, suppress
+from typing import Dict, Iterable, Optional, Set
+
+import redis.asyncio as aioredis
+
+from stream_protocol import JOB_STATUS_CHANNEL
+
+
+class JobStatusNotifier:
+    """
+    Delivers job status transitions published by workers to waiting clients.
+
+    One pub/sub connection per server process listens on JOB_STATUS_CHANNEL
+    and hands each transition to the in-process watchers of that job.
+    """
+
+    def __init__(self, pool: aioredis.ConnectionPool):
+        self._redis = aioredis.Redis(connection_pool=pool)
+        self._pubsub = None
+        self._watchers: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(JOB_STATUS_CHANNEL)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        if self._pubsub:
+            await self._pubsub.aclose()
+
+    @asynccontextmanager
+    async def watch(self, job_ids: Iterable[str]):
+        """Queue receiving status events for any of `job_ids`"""
+        job_ids = set(job_ids)
+        updates: asyncio.Queue = asyncio.Queue()
+        for job_id in job_ids:
+            self._watchers.setdefault(job_id, set()).add(updates)
+        try:
+            yield updates
+        finally:
+            for job_id in job_ids:
+                watchers = self._watchers.get(job_id)
+                if watchers is None:
+                    continue
+                watchers.discard(updates)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    def stats(self):
+        return {"watched_jobs": len(self._watchers)}
+
+    async def _run(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=None)
+                if message is None:
+                    continue
+                event = json.loads(message["data"])
+                for updates in list(self._watchers.get(event.get("job_id"), ())):
+                    updates.put_nowait(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job notifier error: {e}")
+                await asyncio.sleep(1)
@@ -0,0 +1,286 @@
+# job_runner.py
+
+"""
+Runs RQ jobs concurrently in one process on a bounded thread pool.
+
+Chat jobs spend nearly all their time waiting on the LLM, so one process can
+serve many of them at once. ThreadedWorker dequeues up to
+WORKER_CONCURRENCY jobs from the given queues (in priority order) and runs
+each on a pool thread. Jobs share the process's warm graph and connections.
+RQ bookkeeping (job status, results, failed registry, dependents) is the
+same as for `rq worker`.
+
+Timeouts: threads cannot be killed, so job_timeout is enforced in two ways.
+A job that calls check_deadline() (chat jobs do, once per streamed chunk)
+raises JobTimeoutException once it is over time. A job that never gets
+there is marked failed by the worker at the deadline, and its late result
+is discarded. Its thread keeps running, so it moves to one of
+WORKER_OVERDUE_THREADS spare threads and frees its slot for a new job; once
+those are all taken, overdue jobs keep their slots.
+
+Each running job has an RQ execution in the queue's StartedJobRegistry, and
+its heartbeat is refreshed every job_monitoring_interval like under
+`rq worker`, so RQ's cleanup does not fail jobs that are still running.
+
+Shutdown: the first SIGINT/SIGTERM stops dequeuing and waits up to
+WORKER_DRAIN_TIMEOUT_S for running jobs to finish, then fails the ones
+left and exits without waiting for their threads; a second one exits
+right away.
+
+The bookkeeping mirrors rq.Worker and uses some of RQ's private state
+(Job._result and _status, Queue.intermediate_queue_key,
+rq.executions.Execution). It is written against rq==2.4.1, the version
+in requirements.txt; check it, and tests/test_job_runner.py, when
+upgrading RQ.
+"""
+
+import os
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List
+
+from rq import Queue, Worker
+from rq.exceptions import DequeueTimeout
+from rq.executions import Execution
+from rq.job import JobStatus
+from rq.timeouts import JobTimeoutException
+from rq.utils import now
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 32))
+# Longest time to wait for running jobs on shutdown; matches job_timeout='5m'
+WORKER_DRAIN_TIMEOUT_S = float(os.getenv("WORKER_DRAIN_TIMEOUT_S", 300))
+# Blocking dequeue timeout; bounds how long a shutdown request goes unnoticed
+WORKER_DEQUEUE_TIMEOUT_S = 5
+# Threads beyond WORKER_CONCURRENCY for jobs failed as overdue that are still running
+WORKER_OVERDUE_THREADS = int(os.getenv("WORKER_OVERDUE_THREADS", 8))
+
+_current = threading.local()
+
+
+def check_deadline():
+    """Raise JobTimeoutException if the job on this thread is past its timeout"""
+    deadline = getattr(_current, "deadline", None)
+    if deadline is not None and time.monotonic() > deadline:
+        raise JobTimeoutException(f"Job exceeded maximum timeout value ({_current.timeout} seconds)")
+
+
+class RunningJob:
+    def __init__(self, job, queue, timeout: int):
+        self.job = job
+        self.queue = queue
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.future = None
+        # The job's RQ execution, in the StartedJobRegistry while it runs
+        self.execution = None
+        # Set once the worker has failed the job for running over time
+        self.expired = False
+        # Set if the job gave its slot up for a spare thread when it expired
+        self.overdue = False
+
+
+class ThreadedWorker:
+    def __init__(self, queues: List[str], connection, concurrency: int = WORKER_CONCURRENCY,
+                 overdue_threads: int = WORKER_OVERDUE_THREADS):
+        self.connection = connection
+        self.concurrency = concurrency
+        self.overdue_threads = overdue_threads
+        # Registration, heartbeats and job bookkeeping as a regular RQ worker
+        self.worker = Worker(queues, connection=connection)
+        self.queues = self.worker.queues
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._running: Dict[str, RunningJob] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        # Overdue jobs still running on spare threads
+        self._overdue = 0
+        self._last_job_heartbeat = 0.0
+        self.completed = 0
+        self.failed = 0
+
+    def stats(self):
+        return {
+            "running": len(self._running),
+            "concurrency": self.concurrency,
+            "overdue": self._overdue,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def request_stop(self, signum=None, frame=None):
+        if self._stopping.is_set():
+            print("Forced shutdown, abandoning running jobs")
+            os._exit(1)
+        print(f"Shutting down: draining {len(self._running)} running jobs")
+        self._stopping.set()
+
+    def work(self):
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        self.worker.register_birth()
+        print(f"Worker {self.worker.name} running up to {self.concurrency} jobs "
+              f"from {', '.join(q.name for q in self.queues)}")
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency + self.overdue_threads,
+                                      thread_name_prefix="job")
+        try:
+            while not self._stopping.is_set():
+                self.worker.heartbeat()
+                self._heartbeat_jobs()
+                self._expire_overdue()
+                # Only take a job when a thread is free to run it
+                if not self._slots.acquire(timeout=1):
+                    continue
+                try:
+                    result = Queue.dequeue_any(self.queues, WORKER_DEQUEUE_TIMEOUT_S, connection=self.connection)
+                except DequeueTimeout:
+                    result = None
+                if result is None:
+                    self._slots.release()
+                    continue
+                job, queue = result
+                if self._stopping.is_set():
+                    # Dequeued as shutdown was requested: leave it to another worker
+                    queue.enqueue_job(job, at_front=True)
+                    self._slots.release()
+                    break
+                self._start(executor, job, queue)
+        finally:
+            drained = self._drain()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.worker.register_death()
+            if not drained:
+                # The interpreter joins pool threads at exit, which would
+                # wait for the stuck jobs after all
+                os._exit(1)
+
+    def _start(self, executor, job, queue):
+        timeout = job.timeout or Queue.DEFAULT_TIMEOUT
+        running = RunningJob(job, queue, timeout)
+        # As Worker.prepare_execution and prepare_job_execution, minus the
+        # worker's current job, which a worker running many jobs does not have
+        ttl = self._heartbeat_ttl(running)
+        with self.connection.pipeline() as pipe:
+            running.execution = Execution.create(job, ttl, pipeline=pipe)
+            job.heartbeat(now(), ttl, pipeline=pipe)
+            job.prepare_for_execution(self.worker.name, pipeline=pipe)
+            # A single queue is dequeued through RQ's intermediate list
+            pipe.lrem(queue.intermediate_queue_key, 1, job.id)
+            pipe.execute()
+        with self._lock:
+            self._running[job.id] = running
+        running.future = executor.submit(self._perform, running)
+
+    def _perform(self, running: RunningJob):
+        job, queue = running.job, running.queue
+        _current.deadline, _current.timeout = running.deadline, running.timeout
+        try:
+            return_value = job.perform()
+            error = None
+        except Exception:
+            error = traceback.format_exc()
+        finally:
+            _current.deadline = _current.timeout = None
+            with self._lock:
+                self._running.pop(job.id, None)
+                if running.overdue:
+                    self._overdue -= 1
+            if not running.overdue:
+                self._slots.release()
+
+        if running.expired:
+            # Already failed by the worker; discard the late outcome
+            return
+        self._finish(running, error, return_value if error is None else None)
+
+    def _heartbeat_ttl(self, running: RunningJob) -> int:
+        # As Worker.get_heartbeat_ttl, from this job's own start
+        remaining = running.deadline - time.monotonic()
+        return int(max(min(remaining, self.worker.job_monitoring_interval), 0)) + 60
+
+    def _heartbeat_jobs(self):
+        """Refresh the executions and heartbeats of running jobs, as Worker.maintain_heartbeats"""
+        if time.monotonic() - self._last_job_heartbeat < self.worker.job_monitoring_interval:
+            return
+        self._last_job_heartbeat = time.monotonic()
+        with self._lock:
+            running = [r for r in self._running.values() if not r.expired]
+        if not running:
+            return
+        with self.connection.pipeline() as pipe:
+            for r in running:
+                ttl = self._heartbeat_ttl(r)
+                r.execution.heartbeat(r.queue.started_job_registry, ttl, pipeline=pipe)
+                r.job.heartbeat(now(), ttl, pipeline=pipe)
+            results = pipe.execute()
+        # A job that finished meanwhile with result_ttl=0 is already deleted,
+        # and its heartbeat (the last command of each job) recreated the key
+        per_job = len(results) // len(running)
+        created = results[per_job - 1::per_job]
+        deleted = [r.job.key for r, new in zip(running, created) if new == 1]
+        if deleted:
+            self.connection.delete(*deleted)
+
+    def _finish(self, running: RunningJob, error, return_value=None):
+        job, queue = running.job, running.queue
+        job.ended_at = now()
+        with self._lock:
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        try:
+            if error is None:
+                job._result = return_value
+                self.worker.handle_job_success(job, queue, queue.started_job_registry)
+            else:
+                job._status = JobStatus.FAILED
+                self.worker.handle_job_failure(job, queue, exc_string=error)
+                print(f"Job {job.id} failed:\n{error}")
+        except Exception as e:
+            print(f"Bookkeeping for job {job.id} failed: {e}")
+        # RQ's handlers only remove the worker's own execution
+        try:
+            with self.connection.pipeline() as pipe:
+                running.execution.delete(job=job, pipeline=pipe)
+                pipe.execute()
+        except Exception as e:
+            print(f"Removing the execution of job {job.id} failed: {e}")
+
+    def _expire_overdue(self):
+        now_ = time.monotonic()
+        with self._lock:
+            overdue = [r for r in self._running.values() if not r.expired and now_ > r.deadline]
+            for running in overdue:
+                running.expired = True
+                # Its thread is still busy: move it to a spare one and free
+                # the slot, while there are spare threads left
+                if self._overdue < self.overdue_threads:
+                    running.overdue = True
+                    self._overdue += 1
+        for running in overdue:
+            if running.overdue:
+                self._slots.release()
+            self._finish(running,
+                         f"JobTimeoutException: Job exceeded maximum timeout value ({running.timeout} seconds)")
+
+    def _drain(self) -> bool:
+        """Wait for running jobs; False if some were still running at the timeout"""
+        with self._lock:
+            futures = [r.future for r in self._running.values() if r.future is not None]
+        if not futures:
+            return True
+        _, pending = wait(futures, timeout=WORKER_DRAIN_TIMEOUT_S)
+        if not pending:
+            return True
+        print(f"Drain timed out with {len(pending)} jobs still running")
+        with self._lock:
+            abandoned = [r for r in self._running.values() if not r.expired]
+            for running in abandoned:
+                running.expired = True
+        for running in abandoned:
+            self._finish(running, "Worker shut down before the job finished")
+        return False
@@ -0,0 +1,140 @@
+# llm_cache.py
+
+"""
+Content-addressed cache of LLM responses in Redis, for the model calls
+that are safe to replay: the Trustcall extractors and the instruction
+update. The streamed reply to the user never goes through it.
+
+It plugs into LangChain's cache interface, so a chat model built with
+cache=LLMCache(...) looks up every call before sending it. Entries are
+keyed on a hash of the model's name and parameters (including bound tools)
+and the messages, which carry the existing documents Trustcall patches.
+Message ids are left out, so a replayed conversation or the same input from
+another user hits the same entry.
+
+Entries expire after LLM_CACHE_TTL_S; beyond LLM_CACHE_MAX_ENTRIES the
+least recently used are evicted. Hits, misses and the model time saved are
+counted in Redis for all workers (GET /llm_cache/stats on the API server).
+
+Opt-in with LLM_CACHE=1.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import redis
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration
+
+from storage import LLM_CACHE_STATS_KEY
+
+LLM_CACHE_TTL_S = int(os.getenv("LLM_CACHE_TTL_S", 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10000))
+
+# Sorted set of entry keys by last use, for LRU eviction
+LRU_KEY = "llm_cache:lru"
+
+# Return an entry and mark it used, counting the hit (with the model time it
+# saves) or the miss
+_LOOKUP = """
+local value = redis.call('GET', KEYS[1])
+if value then
+    redis.call('ZADD', KEYS[2], ARGV[1], KEYS[1])
+    redis.call('HINCRBY', KEYS[3], 'hits', 1)
+    redis.call('HINCRBYFLOAT', KEYS[3], 'saved_ms', cjson.decode(value)['ms'])
+else
+    redis.call('HINCRBY', KEYS[3], 'misses', 1)
+end
+return value
+"""
+
+# Store an entry, then evict the least recently used beyond the size bound.
+# Entries that expired on their own are dropped from the index the same way.
+_STORE = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[4])
+if excess > 0 then
+    local victims = redis.call('ZRANGE', KEYS[2], 0, excess - 1)
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, excess - 1)
+    redis.call('DEL', unpack(victims))
+end
+"""
+
+
+def entry_key(prompt: str, llm_string: str) -> str:
+    """Hash of the model and the messages, ignoring message ids"""
+    messages = json.loads(prompt)
+    for message in messages:
+        message.get("kwargs", {}).pop("id", None)
+    content = json.dumps([llm_string, messages], sort_keys=True)
+    return f"llm_cache:{hashlib.sha256(content.encode()).hexdigest()}"
+
+
+class LLMCache(BaseCache):
+    def __init__(self, redis_client, ttl_s: int = LLM_CACHE_TTL_S, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.redis = redis_client
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lookup_script = redis_client.register_script(_LOOKUP)
+        self._store_script = redis_client.register_script(_STORE)
+        # When each thread's last miss was looked up, to time the model call
+        self._missed = threading.local()
+
+    def lookup(self, prompt: str, llm_string: str):
+        key = entry_key(prompt, llm_string)
+        try:
+            value = self._lookup_script(keys=[key, LRU_KEY, LLM_CACHE_STATS_KEY], args=[time.time()])
+        except redis.RedisError as e:
+            # Never fail a model call over the cache: call the model instead
+            print(f"LLM cache lookup failed: {e}")
+            value = None
+        if value is None:
+            self._missed.key, self._missed.at = key, time.monotonic()
+            return None
+        return [
+            ChatGeneration(message=messages_from_dict([generation["message"]])[0],
+                           generation_info=generation["info"])
+            for generation in json.loads(value)["generations"]
+        ]
+
+    def update(self, prompt: str, llm_string: str, return_val):
+        key = entry_key(prompt, llm_string)
+        started = self._missed.at if getattr(self._missed, "key", None) == key else None
+        self._missed.key = None
+        value = json.dumps({
+            "generations": [
+                {"message": message_to_dict(generation.message), "info": generation.generation_info}
+                for generation in return_val
+            ],
+            # Model time a hit saves
+            "ms": (time.monotonic() - started) * 1000 if started is not None else 0,
+        }, default=str)
+        try:
+            self._store_script(keys=[key, LRU_KEY], args=[value, self.ttl_s, time.time(), self.max_entries])
+        except redis.RedisError as e:
+            print(f"LLM cache update failed: {e}")
+
+    def clear(self, **kwargs):
+        keys = self.redis.zrange(LRU_KEY, 0, -1)
+        with self.redis.pipeline(transaction=True) as pipe:
+            if keys:
+                pipe.delete(*keys)
+            pipe.delete(LRU_KEY, LLM_CACHE_STATS_KEY)
+            pipe.execute()
+
+
+def build_llm_cache():
+    """The shared LLM response cache if LLM_CACHE=1, else None"""
+    if os.getenv("LLM_CACHE", "0") != "1":
+        return None
+    return LLMCache(redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=int(os.getenv("REDIS_DB", 0)),
+        decode_responses=True
+    ))
@@ -0,0 +1,315 @@
+# memory_cache.py
+
+"""
+Per-user snapshot of long-term memory (profile, todos and instructions).
+
+Graph nodes read a user's memories through MemoryCache instead of calling
+store.search themselves. A snapshot is loaded from the store once, kept in
+an in-process LRU and, when a Redis client is given, shared with other
+workers. Writes go through MemoryCache.put (or put_many for everything
+one extraction produced), which writes to the store, updates the local
+snapshot in place and bumps the user's version so every other copy is
+discarded.
+
+On a miss all three namespaces are read in a single round trip: one SQL
+query on PostgresStore, one store.batch call on any other store.
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+from langgraph.store.base import PutOp, SearchOp
+from psycopg.types.json import Jsonb
+from langgraph.store.postgres import PostgresStore
+from psycopg.rows import tuple_row
+
+from db.pool import borrow_connection
+from storage import initial_version, snapshot_key, version_key
+from todo_context import TODO_CONTEXT_CANDIDATES
+
+MEMORY_CACHE_MAX_USERS = int(os.getenv("MEMORY_CACHE_MAX_USERS", 1024))
+MEMORY_CACHE_TTL_S = int(os.getenv("MEMORY_CACHE_TTL_S", 3600))
+# Without Redis nothing tells a worker about another one's writes, so local
+# snapshots are reloaded after this long
+MEMORY_CACHE_LOCAL_TTL_S = float(os.getenv("MEMORY_CACHE_LOCAL_TTL_S", 30))
+
+# Lightweight stand-in for langgraph's store Item: what the nodes use of it
+MemoryItem = namedtuple("MemoryItem", ["key", "value"])
+
+# Snapshot section for each memory namespace kind
+KINDS = ("profile", "todo", "instructions")
+# Items loaded per namespace besides todos (store.search's default limit)
+MEMORY_LOAD_LIMIT = 10
+
+
+# Move the user to the next version and drop the shared snapshot. A missing
+# counter starts from a random value (see storage.initial_version).
+_BUMP_VERSION = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+local version = redis.call('INCR', KEYS[1])
+redis.call('DEL', KEYS[2])
+return version
+"""
+
+
+# Store a snapshot only if it is still the user's current version
+_PUBLISH_SNAPSHOT = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') == tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+# Every memory of a user, newest first per namespace, like store.search.
+# Namespaces are matched exactly, so ("todo", "u1") does not pick up "u10".
+_LOAD_MEMORIES = """
+SELECT kind, key, value
+FROM (
+    SELECT split_part(prefix, '.', 1) AS kind, key, value, updated_at,
+           row_number() OVER (PARTITION BY prefix ORDER BY updated_at DESC) AS rn
+    FROM store
+    WHERE prefix = ANY(%(prefixes)s)
+) ranked
+WHERE rn <= CASE kind WHEN 'todo' THEN %(todo_limit)s ELSE %(limit)s END
+ORDER BY kind, rn
+"""
+
+
+# One row per written memory; the same statement as PostgresStore.put
+_UPSERT_MEMORY = """
+INSERT INTO store (prefix, key, value, created_at, updated_at, expires_at, ttl_minutes)
+VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, NULL, NULL)
+ON CONFLICT (prefix, key) DO UPDATE
+SET value = EXCLUDED.value,
+    updated_at = CURRENT_TIMESTAMP,
+    expires_at = EXCLUDED.expires_at,
+    ttl_minutes = EXCLUDED.ttl_minutes
+"""
+
+_DELETE_MEMORIES = "DELETE FROM store WHERE prefix = %s AND key = ANY(%s)"
+
+
+def load_memories(store, user_id: str, todo_limit: int = TODO_CONTEXT_CANDIDATES):
+    """Profile, todos and instructions of a user in one round trip"""
+    items = {kind: [] for kind in KINDS}
+    if isinstance(store, PostgresStore):
+        params = {
+            "prefixes": [f"{kind}.{user_id}" for kind in KINDS],
+            "todo_limit": todo_limit,
+            "limit": MEMORY_LOAD_LIMIT,
+        }
+        with borrow_connection(store) as conn, conn.cursor(row_factory=tuple_row) as cur:
+            cur.execute(_LOAD_MEMORIES, params)
+            for kind, key, value in cur.fetchall():
+                items[kind].append(MemoryItem(key, value))
+        return items
+
+    results = store.batch([
+        SearchOp((kind, user_id), limit=todo_limit if kind == "todo" else MEMORY_LOAD_LIMIT)
+        for kind in KINDS
+    ])
+    for kind, found in zip(KINDS, results):
+        items[kind] = [MemoryItem(item.key, item.value) for item in found if item.namespace == (kind, user_id)]
+    return items
+
+
+def write_memories(store, namespace: tuple, puts: dict, deletes=()):
+    """
+    Upsert `puts` ({key: value}) and delete `deletes` (keys) in one namespace,
+    all or nothing. On PostgresStore this is a single transaction, sent as
+    one pipelined batch; on any other store, one store.batch call.
+    """
+    deletes = [key for key in deletes if key not in puts]
+    if isinstance(store, PostgresStore):
+        prefix = ".".join(namespace)
+        with borrow_connection(store) as conn, conn.transaction(), conn.cursor() as cur:
+            if puts:
+                cur.executemany(_UPSERT_MEMORY, [(prefix, key, Jsonb(value)) for key, value in puts.items()])
+            if deletes:
+                cur.execute(_DELETE_MEMORIES, (prefix, deletes))
+        return
+
+    store.batch(
+        [PutOp(namespace, key, value) for key, value in puts.items()]
+        + [PutOp(namespace, key, None) for key in deletes]
+    )
+
+
+def render_profile(items) -> str:
+    return str(items[0].value) if items else "None"
+
+
+def render_instructions(items) -> str:
+    return str(items[0].value) if items else ""
+
+
+class MemorySnapshot:
+    """A user's memories at one version, with pre-rendered prompt blocks"""
+
+    def __init__(self, user_id: str, version: int, items: dict):
+        self.user_id = user_id
+        self.version = version
+        self.items = {kind: list(items.get(kind, [])) for kind in KINDS}
+        self.loaded_at = time.monotonic()
+        self.render()
+
+    def render(self):
+        self.profile_block = render_profile(self.items["profile"])
+        self.instructions_block = render_instructions(self.items["instructions"])
+
+    def get(self, kind: str, key: str):
+        for item in self.items[kind]:
+            if item.key == key:
+                return item
+        return None
+
+    def apply_put(self, kind: str, key: str, value: dict):
+        items = [item for item in self.items[kind] if item.key != key]
+        items.append(MemoryItem(key, value))
+        self.items[kind] = items
+        self.render()
+
+    def apply_writes(self, kind: str, puts: dict, deletes=()):
+        removed = set(puts) | set(deletes)
+        items = [item for item in self.items[kind] if item.key not in removed]
+        items.extend(MemoryItem(key, value) for key, value in puts.items())
+        self.items[kind] = items
+        self.render()
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "version": self.version,
+            "items": {kind: [[item.key, item.value] for item in items] for kind, items in self.items.items()}
+        })
+
+    @classmethod
+    def from_json(cls, user_id: str, data: str):
+        data = json.loads(data)
+        items = {kind: [MemoryItem(key, value) for key, value in pairs] for kind, pairs in data["items"].items()}
+        return cls(user_id, data["version"], items)
+
+
+class MemoryCache:
+    """
+    Versioned per-user memory snapshots: in-process LRU, optionally shared
+    through Redis. With Redis the user's version lives in Redis, so a write
+    from any worker invalidates every cached copy. Without it, local copies
+    expire after `local_ttl_s`.
+    """
+
+    def __init__(self, redis_client=None, max_users: int = MEMORY_CACHE_MAX_USERS,
+                 local_ttl_s: float = MEMORY_CACHE_LOCAL_TTL_S):
+        self.redis = redis_client
+        self._publish_script = redis_client.register_script(_PUBLISH_SNAPSHOT) if redis_client is not None else None
+        self._bump_script = redis_client.register_script(_BUMP_VERSION) if redis_client is not None else None
+        self.max_users = max_users
+        self.local_ttl_s = local_ttl_s
+        self._snapshots: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def snapshot(self, store, user_id: str) -> MemorySnapshot:
+        """Current memories of a user, loading them from the store on a miss"""
+        version = self._shared_version(user_id)
+
+        with self._lock:
+            cached = self._snapshots.get(user_id)
+            if cached is not None and self._current(cached, version):
+                self._snapshots.move_to_end(user_id)
+                self.hits += 1
+                return cached
+
+        # The shared snapshot can be large: only read it on a local miss
+        shared = self.redis.get(snapshot_key(user_id)) if self.redis is not None else None
+        if shared is not None:
+            snapshot = MemorySnapshot.from_json(user_id, shared)
+            if snapshot.version == version:
+                self.hits += 1
+                self._remember(snapshot)
+                return snapshot
+
+        self.misses += 1
+        snapshot = MemorySnapshot(user_id, version or 0, load_memories(store, user_id))
+        self._remember(snapshot)
+        self._publish(snapshot)
+        return snapshot
+
+    def put(self, store, namespace: tuple, key: str, value: dict):
+        """Write a memory through to the store and the user's snapshot"""
+        kind, user_id = namespace
+        store.put(namespace, key, value)
+        self._bump(user_id, lambda snapshot: snapshot.apply_put(kind, key, value))
+
+    def put_many(self, store, namespace: tuple, puts: dict, deletes=()):
+        """
+        Apply every write of one extraction atomically: readers see all of
+        them or none, in both the store and the user's snapshot
+        """
+        if not puts and not deletes:
+            return
+        kind, user_id = namespace
+        write_memories(store, namespace, puts, deletes)
+        self._bump(user_id, lambda snapshot: snapshot.apply_writes(kind, puts, deletes))
+
+    def invalidate(self, user_id: str):
+        self._bump(user_id, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "users": len(self._snapshots)}
+
+    def _shared_version(self, user_id: str):
+        """The user's version from Redis, or None without Redis"""
+        if self.redis is None:
+            return None
+        return int(self.redis.get(version_key(user_id)) or 0)
+
+    def _current(self, snapshot: MemorySnapshot, version) -> bool:
+        if version is None:
+            return time.monotonic() - snapshot.loaded_at < self.local_ttl_s
+        return snapshot.version == version
+
+    def _bump(self, user_id: str, update):
+        """
+        Move the user to a new version. The local snapshot is updated in place
+        when it was current; a concurrent write elsewhere forces a reload.
+        """
+        with self._lock:
+            cached = self._snapshots.get(user_id)
+
+        if self.redis is not None:
+            version = self._bump_script(keys=[version_key(user_id), snapshot_key(user_id)],
+                                        args=[initial_version()])
+        else:
+            version = (cached.version if cached else 0) + 1
+
+        with self._lock:
+            if cached is None or update is None or cached.version != version - 1:
+                self._snapshots.pop(user_id, None)
+                return
+            update(cached)
+            cached.version = version
+        # Share the updated snapshot, so other workers skip the store too
+        self._publish(cached)
+
+    def _publish(self, snapshot: MemorySnapshot):
+        if self._publish_script is None:
+            return
+        self._publish_script(
+            keys=[version_key(snapshot.user_id), snapshot_key(snapshot.user_id)],
+            args=[snapshot.version, snapshot.to_json(), MEMORY_CACHE_TTL_S]
+        )
+
+    def _remember(self, snapshot: MemorySnapshot):
+        with self._lock:
+            self._snapshots[snapshot.user_id] = snapshot
+            self._snapshots.move_to_end(snapshot.user_id)
+            while len(self._snapshots) > self.max_users:
+                self._snapshots.popitem(last=False)
@@ -1,23 +1,77 @@
 # server.py
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
+from datetime import datetime
 import uuid
 import json
+import hashlib
 import redis
 from rq import Queue
 import asyncio
 import redis.asyncio as aioredis
 import uvicorn
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import os
+import re
+from stream_protocol import text_length, is_terminal, TERMINAL_STATUSES
+from stream_hub import StreamHub, EXPIRED
+from job_notifier import JobStatusNotifier
+from storage import get_pool, pool_stats, close_pool, initial_version, version_key, LLM_CACHE_STATS_KEY
+from todo_query import list_todos, TODO_FIELDS, TODOS_PAGE_DEFAULT, TODOS_PAGE_MAX
 
 load_dotenv()
 
-app = FastAPI(title="ToDo mAIstro API", version="1.0.0")
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+# Upper bound on sockets this process opens to Redis, shared by every endpoint
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = int(os.getenv("REDIS_POOL_TIMEOUT", 20))
+# Idle SSE connections get a keepalive event this often
+SSE_KEEPALIVE_S = float(os.getenv("SSE_KEEPALIVE_S", 15))
+# How often an idle SSE connection checks whether its client has gone away
+SSE_DISCONNECT_CHECK_S = float(os.getenv("SSE_DISCONNECT_CHECK_S", 1))
+# Reconnect delay suggested to browsers via the SSE retry field
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", 3000))
+STREAM_ID_PATTERN = re.compile(r"^\d+(-\d+)?$")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the app-lifetime async Redis pool and close it on shutdown"""
+    app.state.redis_pool = aioredis.BlockingConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        decode_responses=True
+    )
+    app.state.redis = aioredis.Redis(connection_pool=app.state.redis_pool)
+    # Single reader task that serves every /stream client in this process
+    app.state.stream_hub = StreamHub(app.state.redis_pool)
+    await app.state.stream_hub.start()
+    # Single pub/sub listener for job status transitions published by workers
+    app.state.job_notifier = JobStatusNotifier(app.state.redis_pool)
+    await app.state.job_notifier.start()
+    try:
+        yield
+    finally:
+        await app.state.job_notifier.stop()
+        await app.state.stream_hub.stop()
+        await app.state.redis.aclose()
+        await app.state.redis_pool.aclose()
+        redis_client.close()
+        # Opened on first use by /todos/get (see db/pool.py)
+        close_pool()
+
+
+app = FastAPI(title="ToDo mAIstro API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -26,17 +80,78 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    # Lets the frontend revalidate /todos/get with If-None-Match
+    expose_headers=["ETag"],
 )
 
-# Redis connection
+# Sync Redis connection for RQ only. RQ is blocking, so it is always driven
+# from a worker thread (see submit_jobs) and never from the event loop.
 redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST", "localhost"),
-    port=int(os.getenv("REDIS_PORT", 6379)),
-    db=int(os.getenv("REDIS_DB", 0)),
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB,
+    max_connections=REDIS_MAX_CONNECTIONS,
     decode_responses=True
 )
 job_queue = Queue('chat_jobs', connection=redis_client)
 
+# SSE connections in this process. "abandoned" counts streams whose client
+# left before a terminal event; readers still attached to the stream hub
+# beyond "active" would be leaks.
+stream_stats = {"active": 0, "finished": 0, "abandoned": 0}
+
+
+def get_redis() -> aioredis.Redis:
+    """Async Redis client backed by the shared app-lifetime pool"""
+    return app.state.redis
+
+
+JOB_META_TTL = 3600
+JOB_STATUS_BATCH_MAX_ITEMS = int(os.getenv("JOB_STATUS_BATCH_MAX_ITEMS", 1000))
+JOB_STATUS_WAIT_MAX_S = float(os.getenv("JOB_STATUS_WAIT_MAX_S", 30))
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", 500))
+# /todos/get responses are cached per user version, which the workers bump on
+# every memory write when they share memory snapshots through Redis
+TODOS_CACHE_ENABLED = os.getenv("MEMORY_CACHE_REDIS", "1") == "1"
+# Backstop for writes that bypass the workers' memory cache
+TODOS_CACHE_TTL_S = int(os.getenv("TODOS_CACHE_TTL_S", 300))
+
+
+def _submit_jobs_sync(job_payloads: List[Dict[str, Any]]):
+    """
+    Write the meta hash, its TTL and the RQ job for every payload in a single
+    MULTI/EXEC, so workers can never pick up a job whose meta is missing
+    """
+    with redis_client.pipeline(transaction=True) as pipe:
+        for job_payload in job_payloads:
+            meta_key = f"job:{job_payload['job_id']}:meta"
+            pipe.hset(meta_key, mapping={
+                "user_id": job_payload["user_id"],
+                "thread_id": job_payload["thread_id"],
+                "status": "queued",
+                "job_type": job_payload["job_type"]
+            })
+            pipe.expire(meta_key, JOB_META_TTL)
+
+        job_queue.enqueue_many(
+            [
+                Queue.prepare_data(
+                    'worker.process_chat_job',
+                    args=(job_payload,),
+                    job_id=job_payload["job_id"],
+                    timeout='5m'
+                )
+                for job_payload in job_payloads
+            ],
+            pipeline=pipe
+        )
+        pipe.execute()
+
+
+async def submit_jobs(job_payloads: List[Dict[str, Any]]):
+    """Submit chat jobs in one round trip without blocking the event loop"""
+    await asyncio.to_thread(_submit_jobs_sync, job_payloads)
+
 # Pydantic models
 class NewChatRequest(BaseModel):
     user_id: str
@@ -47,23 +162,53 @@ class ContinueChatRequest(BaseModel):
     thread_id: str
     message: str
 
+class BatchChatItem(BaseModel):
+    user_id: str
+    thread_id: Optional[str] = None  # omit to start a new chat
+    message: str
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+
 class GetTodosRequest(BaseModel):
     user_id: str
+    status: Optional[List[str]] = None   # any of these statuses
+    deadline_from: Optional[datetime] = None
+    deadline_to: Optional[datetime] = None
+    q: Optional[str] = None              # substring of task or solutions
+    cursor: Optional[str] = None         # next_cursor of the previous page
+    limit: int = TODOS_PAGE_DEFAULT
+    fields: Optional[List[str]] = None   # subset of TODO_FIELDS; id is always included
 
 class ChatResponse(BaseModel):
     thread_id: str
     response: str
     job_id: Optional[str] = None
 
+class BatchChatResponse(BaseModel):
+    jobs: List[ChatResponse]
+
 class TodosResponse(BaseModel):
     user_id: str
     todos: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
 
 class JobStatusResponse(BaseModel):
     job_id: str
     status: str
     thread_id: Optional[str] = None
 
+class JobStatusBatchRequest(BaseModel):
+    job_ids: List[str]
+
+class JobStatusWaitRequest(BaseModel):
+    job_ids: List[str]
+    timeout: float = 25  # seconds, capped at JOB_STATUS_WAIT_MAX_S
+
+class JobStatusBatchResponse(BaseModel):
+    jobs: List[JobStatusResponse]
+    not_found: List[str] = []
+
 @app.post("/chat/new", response_model=ChatResponse)
 async def start_new_chat(request: NewChatRequest):
     """Start a new chat session - enqueue job"""
@@ -79,21 +224,8 @@ async def start_new_chat(request: NewChatRequest):
             "job_type": "new_chat"
         }
 
-        job_queue.enqueue(
-            'worker.process_chat_job',
-            job_payload,
-            job_id=job_id,
-            job_timeout='5m'
-        )
+        await submit_jobs([job_payload])
 
-        redis_client.hset(f"job:{job_id}:meta", mapping={
-            "user_id": request.user_id,
-            "thread_id": thread_id,
-            "status": "queued",
-            "job_type": "new_chat"
-        })
-        redis_client.expire(f"job:{job_id}:meta", 3600)
-        
         return ChatResponse(
             thread_id=thread_id,
             response="Job queued successfully. Use /stream endpoint to get real-time updates.",
@@ -117,21 +249,8 @@ async def continue_existing_chat(request: ContinueChatRequest):
             "job_type": "continue_chat"
         }
 
-        job_queue.enqueue(
-            'worker.process_chat_job',
-            job_payload,
-            job_id=job_id,
-            job_timeout='5m'
-        )
+        await submit_jobs([job_payload])
 
-        redis_client.hset(f"job:{job_id}:meta", mapping={
-            "user_id": request.user_id,
-            "thread_id": request.thread_id,
-            "status": "queued",
-            "job_type": "continue_chat"
-        })
-        redis_client.expire(f"job:{job_id}:meta", 3600)
-        
         return ChatResponse(
             thread_id=request.thread_id,
             response="Job queued successfully. Use /stream endpoint to get real-time updates.",
@@ -141,10 +260,42 @@ async def continue_existing_chat(request: ContinueChatRequest):
         raise HTTPException(status_code=500, detail=f"Error continuing chat: {str(e)}")
 
 
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def submit_chat_batch(request: BatchChatRequest):
+    """Enqueue many chat messages in a single Redis round trip"""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    if len(request.items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {CHAT_BATCH_MAX_ITEMS} items")
+    try:
+        job_payloads = []
+        for item in request.items:
+            job_payloads.append({
+                "job_id": str(uuid.uuid4()),
+                "thread_id": item.thread_id or str(uuid.uuid4()),
+                "user_id": item.user_id,
+                "message": item.message,
+                "job_type": "continue_chat" if item.thread_id else "new_chat"
+            })
+
+        await submit_jobs(job_payloads)
+
+        return BatchChatResponse(jobs=[
+            ChatResponse(
+                thread_id=job_payload["thread_id"],
+                response="Job queued successfully. Use /stream endpoint to get real-time updates.",
+                job_id=job_payload["job_id"]
+            )
+            for job_payload in job_payloads
+        ])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting chat batch: {str(e)}")
+
+
 @app.get("/jobs/{job_id}/status", response_model=JobStatusResponse)
 async def get_job_status(job_id: str):
     try:
-        job_meta = redis_client.hgetall(f"job:{job_id}:meta")
+        job_meta = await get_redis().hgetall(f"job:{job_id}:meta")
         if not job_meta:
             raise HTTPException(status_code=404, detail="Job not found")
         return JobStatusResponse(
@@ -158,44 +309,167 @@ async def get_job_status(job_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting job status: {str(e)}")
 
 
+async def fetch_job_statuses(job_ids: List[str]):
+    """Read the meta hash of every job with one pipelined HGETALL batch"""
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for job_id in job_ids:
+            pipe.hgetall(f"job:{job_id}:meta")
+        metas = await pipe.execute()
+
+    jobs, not_found = [], []
+    for job_id, job_meta in zip(job_ids, metas):
+        if not job_meta:
+            not_found.append(job_id)
+            continue
+        jobs.append(JobStatusResponse(
+            job_id=job_id,
+            status=job_meta.get("status", "unknown"),
+            thread_id=job_meta.get("thread_id")
+        ))
+    return jobs, not_found
+
+
+def check_job_ids(job_ids: List[str]):
+    if not job_ids:
+        raise HTTPException(status_code=400, detail="job_ids must not be empty")
+    if len(job_ids) > JOB_STATUS_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {JOB_STATUS_BATCH_MAX_ITEMS} job_ids per request")
+
+
+@app.post("/jobs/status", response_model=JobStatusBatchResponse)
+async def get_job_statuses(request: JobStatusBatchRequest):
+    """Status of many jobs in a single Redis round trip"""
+    check_job_ids(request.job_ids)
+    try:
+        jobs, not_found = await fetch_job_statuses(request.job_ids)
+        return JobStatusBatchResponse(jobs=jobs, not_found=not_found)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting job statuses: {str(e)}")
+
+
+@app.post("/jobs/status/wait", response_model=JobStatusBatchResponse)
+async def wait_for_job_statuses(request: JobStatusWaitRequest):
+    """
+    Long-poll until at least one of the jobs has completed or failed.
+
+    Returns the finished jobs right away if there are any, otherwise waits
+    for a worker to publish a terminal transition or for `timeout` seconds,
+    in which case `jobs` is empty. Clients re-issue the request with the
+    jobs they are still waiting on.
+    """
+    check_job_ids(request.job_ids)
+    timeout = max(0, min(request.timeout, JOB_STATUS_WAIT_MAX_S))
+    try:
+        # Watch before reading, so a transition in between is not missed
+        async with app.state.job_notifier.watch(request.job_ids) as updates:
+            jobs, not_found = await fetch_job_statuses(request.job_ids)
+            finished = [job for job in jobs if job.status in TERMINAL_STATUSES]
+            if finished or not jobs:
+                return JobStatusBatchResponse(jobs=finished, not_found=not_found)
+
+            finished = {}
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while not finished:
+                try:
+                    event = await asyncio.wait_for(updates.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                # Take everything that arrived together, not just the first
+                events = [event]
+                while not updates.empty():
+                    events.append(updates.get_nowait())
+                for event in events:
+                    if event["status"] in TERMINAL_STATUSES:
+                        finished[event["job_id"]] = JobStatusResponse(**event)
+
+            return JobStatusBatchResponse(jobs=list(finished.values()), not_found=not_found)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error waiting for job statuses: {str(e)}")
+
+
 @app.get("/stream/{job_id}")
-async def stream_job_results(job_id: str):
+async def stream_job_results(
+    request: Request,
+    job_id: str,
+    last_event_id: Optional[str] = Header(None),
+    from_id: Optional[str] = Query(None, alias="from")
+):
+    """
+    Stream job events as SSE. Each event's `id:` is its Redis stream entry ID,
+    so reconnects with Last-Event-ID (or ?from=<id>) replay only missed events.
+    """
+    resume_from = last_event_id or from_id
+    if resume_from and not STREAM_ID_PATTERN.match(resume_from):
+        raise HTTPException(status_code=400, detail="Invalid stream ID")
+
     async def generate_stream():
+        stream_stats["active"] += 1
+        # Set once the client has been sent a terminal event
+        finished = False
         try:
-            redis_stream = aioredis.from_url(f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', 6379)}", decode_responses=True)
-            job_meta = await redis_stream.hgetall(f"job:{job_id}:meta")
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+
+            job_meta = await get_redis().hgetall(f"job:{job_id}:meta")
             if not job_meta:
+                finished = True
                 yield f"data: {json.dumps({'type': 'error', 'error': 'Job not found'})}\n\n"
                 return
 
-            stream_key = f"job:{job_id}:stream"
-            last_id = "0"
-            yield f"data: {json.dumps({'type': 'start', 'job_id': job_id, 'status': 'streaming'})}\n\n"
-
-            while True:
-                try:
-                    messages = await redis_stream.xread({stream_key: last_id}, count=1, block=1000)
-                    if messages:
-                        for stream, msgs in messages:
-                            for msg_id, fields in msgs:
-                                last_id = msg_id
-                                event_data = json.loads(fields.get('data', '{}'))
-                                yield f"data: {json.dumps(event_data)}\n\n"
-                                if event_data.get('type') in ['end', 'error']:
-                                    return
-                    
-                    job_exists = await redis_stream.exists(f"job:{job_id}:meta")
-                    if not job_exists:
+            # Reply length already sent to this client (see stream_protocol.py)
+            delivered = 0
+            if not resume_from:
+                yield f"data: {json.dumps({'type': 'start', 'job_id': job_id, 'status': 'streaming'})}\n\n"
+
+            loop = asyncio.get_running_loop()
+            last_write = loop.time()
+            async with app.state.stream_hub.subscribe(job_id, resume_from or "0") as subscription:
+                while True:
+                    try:
+                        entry = await subscription.get(timeout=SSE_DISCONNECT_CHECK_S)
+                    except asyncio.TimeoutError:
+                        # Leaving the loop unsubscribes from the hub right away
+                        if await request.is_disconnected():
+                            return
+                        if loop.time() - last_write >= SSE_KEEPALIVE_S:
+                            last_write = loop.time()
+                            yield f"data: {json.dumps({'type': 'keepalive'})}\n\n"
+                        continue
+
+                    if entry is EXPIRED:
+                        finished = True
                         yield f"data: {json.dumps({'type': 'error', 'error': 'Job expired'})}\n\n"
                         return
-                except asyncio.TimeoutError:
-                    yield f"data: {json.dumps({'type': 'keepalive'})}\n\n"
-                    continue
-                except Exception as e:
-                    yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
-                    return
+
+                    msg_id, fields = entry
+                    data = fields.get('data', '{}')
+                    event_data = json.loads(data)
+                    event_type = event_data.get('type')
+                    if event_type == 'start':
+                        delivered = 0
+                    elif event_type == 'chunk':
+                        end = event_data['offset'] + text_length(event_data['delta'])
+                        if end <= delivered:
+                            # Duplicate of text this client already has
+                            continue
+                        delivered = end
+                    # With deferred memory updates the stream ends at memory_updated
+                    if is_terminal(event_data):
+                        finished = True
+                    last_write = loop.time()
+                    yield f"id: {msg_id}\ndata: {data}\n\n"
+                    if finished:
+                        return
         except Exception as e:
+            finished = True
             yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        finally:
+            # Runs on normal exit, on disconnect and when the response task is
+            # cancelled, so the hub subscription above is always released
+            stream_stats["active"] -= 1
+            stream_stats["finished" if finished else "abandoned"] += 1
 
     return StreamingResponse(
         generate_stream(),
@@ -208,52 +482,124 @@ async def stream_job_results(job_id: str):
     )
 
 
+@app.get("/streams/stats")
+async def get_stream_stats():
+    """Active, finished and abandoned SSE streams in this server process"""
+    return {**stream_stats, "hub": app.state.stream_hub.stats()}
+
+
+@app.get("/llm_cache/stats")
+async def get_llm_cache_stats():
+    """Hits, misses and model time saved by the workers' LLM response cache (LLM_CACHE=1)"""
+    stats = await get_redis().hgetall(LLM_CACHE_STATS_KEY)
+    hits, misses = int(stats.get("hits", 0)), int(stats.get("misses", 0))
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else None,
+        "saved_ms": float(stats.get("saved_ms", 0)),
+    }
+
+
+def _list_todos_sync(request: GetTodosRequest):
+    with get_pool().connection() as conn:
+        return list_todos(
+            conn,
+            request.user_id,
+            status=request.status,
+            deadline_from=request.deadline_from,
+            deadline_to=request.deadline_to,
+            text=request.q,
+            cursor=request.cursor,
+            limit=request.limit,
+            fields=request.fields,
+        )
+
+
+def todos_tag(request: GetTodosRequest, version: int) -> str:
+    """Identifies a /todos/get page: the user's memory version and the query"""
+    query = hashlib.sha1(request.model_dump_json().encode()).hexdigest()[:16]
+    return f"v{version}-{query}"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+
 @app.post("/todos/get", response_model=TodosResponse)
-async def get_user_todos(request: GetTodosRequest):
+async def get_user_todos(request: GetTodosRequest, if_none_match: Optional[str] = Header(None)):
     """
-    Get all todo tasks for a specific user from PostgreSQL store
+    Get a page of a user's todo tasks, optionally filtered by status, deadline
+    range and text. Pass next_cursor back as cursor for the following page.
+    Responses carry an ETag; send it back as If-None-Match to get 304 Not
+    Modified while the user's todos are unchanged.
     """
-    try:
-        # Import the shared PostgresStore-based memory from agent.py
-        from agent import across_thread_memory
-        
-        namespace = ("todo", request.user_id)
-        memories = across_thread_memory.search(namespace)
-
-        todos = []
-        for todo in memories:
-            print(f"Found todo: {todo}")
-            v = todo.value   # This is your dict of todo fields
-            # todo here is an ORM model instance, not a dict
-            todos.append({
-                "id": todo.key,   # Use todo.key as the ID
-                "task": v.get("task"),
-                "time_to_complete": v.get("time_to_complete"),
-                "deadline": v.get("deadline"),  # already ISO string, so no .isoformat()
-                "solutions": v.get("solutions") or [],
-                "status": v.get("status"),
-            })
-
-        return TodosResponse(user_id=request.user_id, todos=todos)
+    if not 1 <= request.limit <= TODOS_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {TODOS_PAGE_MAX}")
+    if request.fields and not set(request.fields) <= set(TODO_FIELDS):
+        raise HTTPException(status_code=400, detail=f"fields must be among {', '.join(TODO_FIELDS)}")
+
+    etag = cache_key = None
+    if TODOS_CACHE_ENABLED:
+        cache = get_redis()
+        try:
+            version = await cache.get(version_key(request.user_id))
+            if version is None:
+                # New or lost (evicted, Redis reset): start it at a random
+                # version, so ETags handed out before cannot match
+                await cache.set(version_key(request.user_id), initial_version(), nx=True)
+                version = await cache.get(version_key(request.user_id))
+            tag = todos_tag(request, int(version))
+            etag = f'"{tag}"'
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            cache_key = f"todos:{request.user_id}:{tag}"
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                return Response(content=cached, media_type="application/json", headers={"ETag": etag})
+        except aioredis.RedisError as e:
+            # Serve from Postgres without caching
+            print(f"Todos cache unavailable: {e}")
+            etag = cache_key = None
 
+    try:
+        # Blocking query: run it off the event loop, on its own pooled connection
+        todos, next_cursor = await asyncio.to_thread(_list_todos_sync, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import traceback
         print(f"Error fetching todos: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Error retrieving todos")
 
+    body = TodosResponse(user_id=request.user_id, todos=todos, next_cursor=next_cursor).model_dump_json()
+    if cache_key is None:
+        return Response(content=body, media_type="application/json")
+    try:
+        await get_redis().set(cache_key, body, ex=TODOS_CACHE_TTL_S)
+    except aioredis.RedisError as e:
+        print(f"Todos cache unavailable: {e}")
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
-        redis_client.ping()
-        queue_length = len(job_queue)
+        redis = get_redis()
+        await redis.ping()
+        queue_length = await redis.llen(job_queue.key)
         return {
             "status": "healthy",
             "message": "ToDo mAIstro API is running",
             "redis_connected": True,
-            "queue_length": queue_length
+            "queue_length": queue_length,
+            "streams": {**stream_stats, "hub": app.state.stream_hub.stats()},
+            "postgres_pool": pool_stats()
         }
     except Exception as e:
         return {
@@ -271,9 +617,14 @@ async def root():
         "endpoints": {
             "POST /chat/new": "Start a new chat session (queued)",
             "POST /chat/continue": "Continue an existing chat session (queued)",
-            "GET /stream/{job_id}": "Stream job results in real-time",
+            "POST /chat/batch": "Enqueue many chat messages at once (queued)",
+            "GET /stream/{job_id}": "Stream job results in real-time (resumable via Last-Event-ID or ?from=)",
             "GET /jobs/{job_id}/status": "Get job status",
-            "POST /todos/get": "Get user's todo tasks",
+            "POST /jobs/status": "Get the status of many jobs at once",
+            "POST /jobs/status/wait": "Long-poll until any of the given jobs completes or fails",
+            "GET /streams/stats": "SSE stream counts for this server process",
+            "GET /llm_cache/stats": "LLM response cache hits, misses and time saved",
+            "POST /todos/get": "Get a filtered page of a user's todo tasks",
             "GET /health": "Health check",
             "GET /docs": "API documentation"
         }
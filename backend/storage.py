@@ -0,0 +1,61 @@
+# storage.py
+
+"""
+Storage shared by the API server and the workers: the process's Postgres
+pool, the LangGraph store and checkpointer on it, and the Redis keys of
+a user's memories and of the LLM response cache's statistics.
+
+Importing this module opens no connection and does not import LangGraph,
+so the API server starts without the agent's dependencies. The store and
+checkpointer are built on first use.
+"""
+
+import secrets
+from threading import Lock
+
+from db.pool import get_pool, pool_stats, close_pool  # noqa: F401
+
+# Hash of LLM response cache hits, misses and saved model time (see llm_cache.py)
+LLM_CACHE_STATS_KEY = "llm_cache:stats"
+
+_store = None
+_checkpointer = None
+_lock = Lock()
+
+
+def version_key(user_id: str) -> str:
+    """Counter bumped on every write to a user's memories"""
+    return f"memory:{user_id}:version"
+
+
+def initial_version() -> int:
+    """
+    Value a user's version counter starts from when its key is created, or
+    recreated after eviction or a Redis reset. Random, so ETags and snapshots
+    from an earlier life of the key do not match the new one.
+    """
+    return secrets.randbits(48)
+
+
+def snapshot_key(user_id: str) -> str:
+    return f"memory:{user_id}:snapshot"
+
+
+def get_store():
+    """Long-term (across-thread) memory: PostgresStore on the process's pool"""
+    global _store
+    with _lock:
+        if _store is None:
+            from langgraph.store.postgres import PostgresStore
+            _store = PostgresStore(get_pool())
+        return _store
+
+
+def get_checkpointer():
+    """Short-term (within-thread) memory, as selected by CHECKPOINTER (see checkpointer.py)"""
+    global _checkpointer
+    with _lock:
+        if _checkpointer is None:
+            from checkpointer import build_checkpointer
+            _checkpointer = build_checkpointer(get_pool())
+        return _checkpointer
@@ -0,0 +1,219 @@
+# stream_hub.py
+
+import asyncio
+import os
+from contextlib import asynccontextmanager, suppress
+from typing import Dict, List, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+
+# One XREAD per process covers every subscribed job stream
+STREAM_HUB_BLOCK_MS = int(os.getenv("STREAM_HUB_BLOCK_MS", 1000))
+STREAM_HUB_COUNT = int(os.getenv("STREAM_HUB_COUNT", 1000))
+# How often the hub checks whether subscribed jobs' meta keys have expired
+STREAM_HUB_EXPIRY_CHECK_S = float(os.getenv("STREAM_HUB_EXPIRY_CHECK_S", 5))
+# Entries buffered per subscriber before it falls back to re-reading Redis
+STREAM_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("STREAM_SUBSCRIBER_QUEUE_SIZE", 1000))
+
+# Queued to a subscriber when its job's meta key is gone
+EXPIRED = object()
+
+
+def stream_key(job_id: str) -> str:
+    return f"job:{job_id}:stream"
+
+
+def parse_stream_id(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class Subscription:
+    """
+    One SSE client's view of a job stream.
+
+    Entries read before the subscription joined the hub (the backlog) are
+    served first, then entries fanned out by the hub. Anything at or before
+    `last_id` is skipped, so overlap between the two is harmless.
+    """
+
+    def __init__(self, hub: "StreamHub", job_id: str, last_id: str = "0"):
+        self.hub = hub
+        self.job_id = job_id
+        self.last_id = last_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_SUBSCRIBER_QUEUE_SIZE)
+        self.backlog: List[Tuple[str, dict]] = []
+        # Set by the hub when the queue overflowed and entries were dropped
+        self.lagged = False
+
+    async def get(self, timeout: Optional[float] = None):
+        """
+        Next (entry_id, fields) for this job, or EXPIRED. Raises
+        asyncio.TimeoutError if nothing arrives within `timeout` seconds.
+        """
+        while True:
+            if self.backlog:
+                entry = self.backlog.pop(0)
+            elif self.lagged and self.queue.empty():
+                # Dropped by the hub as a slow reader: re-read what was missed
+                await self.hub.resubscribe(self)
+                continue
+            else:
+                entry = await asyncio.wait_for(self.queue.get(), timeout)
+
+            if entry is EXPIRED:
+                return EXPIRED
+            entry_id, fields = entry
+            if parse_stream_id(entry_id) <= parse_stream_id(self.last_id):
+                continue
+            self.last_id = entry_id
+            return entry_id, fields
+
+
+class StreamHub:
+    """
+    Multiplexes every SSE reader in this process onto one background task.
+
+    The hub issues a single blocking XREAD over all subscribed
+    `job:*:stream` keys on a dedicated connection and fans entries out to
+    subscribers through in-process asyncio queues. It also detects expired
+    jobs with one pipelined EXISTS batch, instead of each client polling.
+    Redis connections stay constant no matter how many clients are attached.
+    """
+
+    def __init__(self, pool: aioredis.ConnectionPool,
+                 block_ms: int = STREAM_HUB_BLOCK_MS,
+                 count: int = STREAM_HUB_COUNT,
+                 expiry_check_s: float = STREAM_HUB_EXPIRY_CHECK_S):
+        self.block_ms = block_ms
+        self.count = count
+        self.expiry_check_s = expiry_check_s
+
+        self._pool = pool
+        self._redis = aioredis.Redis(connection_pool=pool)
+        self._reader: Optional[aioredis.Redis] = None
+        self._reader_id: Optional[int] = None
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        # Per-job stream ID up to which the hub has read
+        self._cursors: Dict[str, str] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._reader = aioredis.Redis(connection_pool=self._pool, single_connection_client=True)
+        try:
+            self._reader_id = await self._reader.client_id()
+        except Exception:
+            # Without CLIENT ID new streams join on the next XREAD timeout
+            self._reader_id = None
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        if self._reader:
+            await self._reader.aclose()
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str, last_id: str = "0"):
+        """Subscribe to a job stream for entries after `last_id`"""
+        subscription = Subscription(self, job_id, last_id)
+        await self._add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._remove(subscription)
+
+    async def resubscribe(self, subscription: Subscription):
+        """Rejoin a subscription the hub dropped for falling behind"""
+        subscription.lagged = False
+        await self._add(subscription)
+
+    def stats(self):
+        return {
+            "streams": len(self._cursors),
+            "subscribers": sum(len(subs) for subs in self._subscriptions.values())
+        }
+
+    async def _add(self, subscription: Subscription):
+        job_id = subscription.job_id
+        # Join the fan-out first, then read the backlog, so nothing written
+        # in between is missed; duplicates are dropped by the subscription
+        self._subscriptions.setdefault(job_id, set()).add(subscription)
+        start = "-" if subscription.last_id == "0" else f"({subscription.last_id}"
+        backlog = await self._redis.xrange(stream_key(job_id), min=start)
+        subscription.backlog.extend(backlog)
+
+        if job_id not in self._cursors:
+            self._cursors[job_id] = backlog[-1][0] if backlog else subscription.last_id
+            await self._interrupt()
+
+    def _remove(self, subscription: Subscription):
+        job_id = subscription.job_id
+        subscriptions = self._subscriptions.get(job_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[job_id]
+            self._cursors.pop(job_id, None)
+
+    async def _interrupt(self):
+        """Wake the hub so a newly added stream is part of the next XREAD"""
+        self._changed.set()
+        if self._reader_id is not None:
+            with suppress(Exception):
+                await self._redis.client_unblock(self._reader_id)
+
+    def _dispatch(self, job_id: str, entry):
+        for subscription in list(self._subscriptions.get(job_id, ())):
+            if subscription.lagged:
+                continue
+            try:
+                subscription.queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                # Stop feeding a slow reader; it re-reads from Redis itself
+                subscription.lagged = True
+                self._subscriptions[job_id].discard(subscription)
+
+    async def _check_expired(self):
+        job_ids = list(self._cursors)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.exists(f"job:{job_id}:meta")
+            exists = await pipe.execute()
+        for job_id, alive in zip(job_ids, exists):
+            if not alive:
+                self._dispatch(job_id, EXPIRED)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_expiry_check = loop.time()
+        while True:
+            try:
+                if not self._cursors:
+                    self._changed.clear()
+                    await self._changed.wait()
+                    continue
+                self._changed.clear()
+
+                streams = {stream_key(job_id): cursor for job_id, cursor in self._cursors.items()}
+                response = await self._reader.xread(streams, count=self.count, block=self.block_ms)
+                for key, entries in response or []:
+                    job_id = key.split(":")[1]
+                    if job_id not in self._cursors or not entries:
+                        continue
+                    self._cursors[job_id] = entries[-1][0]
+                    for entry in entries:
+                        self._dispatch(job_id, entry)
+
+                if loop.time() - last_expiry_check >= self.expiry_check_s:
+                    last_expiry_check = loop.time()
+                    await self._check_expired()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Stream hub error: {e}")
+                await asyncio.sleep(1)
@@ -0,0 +1,111 @@
+# stream_protocol.py
+
+"""
+Event protocol for job streams.
+
+The worker writes one JSON document per entry to the Redis Stream
+`job:{job_id}:stream`, under the field `data`. The API server forwards the
+same documents to the browser as SSE `data:` lines. Events are:
+
+    {"type": "start", "job_id": ..., "thread_id": ..., "timestamp": ..., "content": ...}
+        Once per job. The only event that repeats job/thread ids and a timestamp.
+
+    {"type": "chunk", "offset": 42, "delta": "text"}
+        Text appended to the reply. `offset` is the length of the reply before
+        `delta` is applied, so offsets increase monotonically. Readers apply a
+        chunk with `text = text[:offset] + delta`, which makes duplicate or
+        replayed chunks harmless. A chunk whose offset is beyond the current
+        length means events were missed.
+
+    {"type": "end", "content": "full reply", "length": 1234}
+        Once per job. Carries the full reply text so late joiners and readers
+        that missed chunks still end up with the right answer. With deferred
+        memory updates it also carries `"memory_update": "pending"`, and is
+        then followed by `memory_updated` instead of ending the stream.
+
+    {"type": "memory_updated", "updates": ["todo", ...]}
+        Written by the follow-up memory job once the store is updated;
+        `updates` lists the memory types that changed (may be empty). On
+        failure it carries `error` instead. Terminal.
+
+    {"type": "error", "error": "message"}
+        Terminal, like `end`.
+
+Offsets and lengths count UTF-16 code units, so they match JavaScript's
+`String.prototype.length` in the frontend.
+
+Job status transitions (running, completed, failed) are also published on
+the pub/sub channel JOB_STATUS_CHANNEL as
+`{"job_id": ..., "status": ..., "thread_id": ...}`, so the API server can
+notify waiting clients without polling the `job:{job_id}:meta` hashes.
+"""
+
+import json
+from datetime import datetime
+
+JOB_STATUS_CHANNEL = "jobs:status"
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def text_length(text: str) -> int:
+    """Length of text in UTF-16 code units"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def slice_text(text: str, end: int) -> str:
+    """Prefix of text that is `end` UTF-16 code units long"""
+    return text.encode("utf-16-le")[:end * 2].decode("utf-16-le", errors="ignore")
+
+
+def start_event(job_id: str, thread_id: str, content: str = None):
+    event = {
+        "type": "start",
+        "job_id": job_id,
+        "thread_id": thread_id,
+        "timestamp": datetime.now().isoformat()
+    }
+    if content:
+        event["content"] = content
+    return event
+
+
+def chunk_event(offset: int, delta: str):
+    return {"type": "chunk", "offset": offset, "delta": delta}
+
+
+def end_event(content: str, memory_update: str = None):
+    event = {"type": "end", "content": content, "length": text_length(content)}
+    if memory_update:
+        event["memory_update"] = memory_update
+    return event
+
+
+def memory_updated_event(updates=None, error: str = None):
+    if error:
+        return {"type": "memory_updated", "error": error}
+    return {"type": "memory_updated", "updates": list(updates or [])}
+
+
+def is_terminal(event) -> bool:
+    """Whether nothing follows this event in the job stream"""
+    if event.get("type") == "end":
+        return event.get("memory_update") != "pending"
+    return event.get("type") in ("error", "memory_updated")
+
+
+def error_event(error: str):
+    return {"type": "error", "error": error}
+
+
+def status_event(job_id: str, status: str, thread_id: str = None):
+    return {"job_id": job_id, "status": status, "thread_id": thread_id}
+
+
+def dumps(event) -> str:
+    """Serialize an event compactly"""
+    return json.dumps(event, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode(event) -> dict:
+    """Stream entry fields for an event"""
+    return {"data": dumps(event)}
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import fakeredis
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Tests import the backend modules the way the server and workers do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeToolModel(BaseChatModel):
+    """Answers every call with one new ToDo, counting the calls"""
+
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-model"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        tool_call = {
+            "name": "ToDo",
+            "args": {"task": "Buy milk", "time_to_complete": 10, "deadline": None,
+                     "solutions": ["Go to the shop"], "status": "not started"},
+            "id": "call-1",
+        }
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="", tool_calls=[tool_call]))])
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(**kwargs)
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_client(redis_server):
+    return fakeredis.FakeRedis(server=redis_server, decode_responses=True)
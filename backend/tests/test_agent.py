@@ -0,0 +1,91 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph import END
+from langgraph.store.memory import InMemoryStore
+from trustcall import create_extractor
+
+import agent
+from conftest import FakeToolModel
+from memory_cache import MemoryCache
+
+
+def update_call(call_id, update_type):
+    return {"name": "UpdateMemory", "args": {"update_type": update_type}, "id": call_id}
+
+
+def chat_state(*tool_calls):
+    return {
+        "messages": [HumanMessage("I need to buy milk and eggs", id="human"),
+                     AIMessage("", tool_calls=list(tool_calls), id="ai")],
+        "extraction_watermarks": {},
+    }
+
+
+def test_no_tool_call_ends_the_turn():
+    assert agent.route_message(chat_state()) == END
+
+
+def test_update_calls_fan_out_one_node_per_memory_type():
+    state = chat_state(update_call("call-1", "todo"), update_call("call-2", "user"), update_call("call-3", "todo"))
+    sends = agent.route_message(state)
+    assert {send.node: [call["id"] for call in send.arg["tool_calls"]] for send in sends} == {
+        "update_todos": ["call-1", "call-3"],
+        "update_profile": ["call-2"],
+    }
+
+
+def test_unknown_update_type_is_rejected():
+    with pytest.raises(ValueError, match="Unknown update_type"):
+        agent.route_message(chat_state(update_call("call-1", "calendar")))
+
+
+def test_update_node_answers_every_call_it_was_sent(monkeypatch):
+    monkeypatch.setattr(agent, "memory_cache", MemoryCache())
+    monkeypatch.setattr(agent, "extractors", {
+        "todo": create_extractor(FakeToolModel(), tools=[agent.ToDo], tool_choice="ToDo", enable_inserts=True)
+    })
+    [send] = agent.route_message(chat_state(update_call("call-1", "todo"), update_call("call-2", "todo")))
+
+    result = agent.update_todos(send.arg, {"configurable": {"user_id": "user"}}, InMemoryStore())
+    assert [message["tool_call_id"] for message in result["messages"]] == ["call-1", "call-2"]
+
+
+def conversation():
+    """Two turns, the first already extracted, then the UpdateMemory call"""
+    return [
+        HumanMessage("I need to buy milk", id="h1"),
+        AIMessage("", tool_calls=[update_call("call-1", "todo")], id="a1"),
+        ToolMessage("updated todos", tool_call_id="call-1", id="t1"),
+        AIMessage("Added buying milk", id="a2"),
+        HumanMessage("And eggs", id="h2"),
+        AIMessage("", tool_calls=[update_call("call-2", "todo")], id="a3"),
+    ]
+
+
+def ids(messages):
+    return [message.id for message in messages]
+
+
+def test_first_extraction_sees_the_whole_window():
+    messages, watermark = agent.messages_since_extraction({"messages": conversation()}, "todo")
+    assert ids(messages) == ["h1", "a1", "t1", "a2", "h2"]
+    assert watermark == "h2"
+
+
+def test_extraction_starts_at_the_first_user_turn_after_the_watermark():
+    state = {"messages": conversation(), "extraction_watermarks": {"todo": "a1", "user": "h2"}}
+    messages, watermark = agent.messages_since_extraction(state, "todo")
+    # The previous extraction's tool reply and the answer to it are skipped
+    assert ids(messages) == ["h2"]
+    assert watermark == "h2"
+
+    messages, watermark = agent.messages_since_extraction(state, "user")
+    assert messages == []
+    assert watermark == "h2"
+
+
+def test_summarized_watermark_means_every_message_is_new():
+    state = {"messages": conversation()[4:], "extraction_watermarks": {"todo": "a1"}}
+    messages, watermark = agent.messages_since_extraction(state, "todo")
+    assert ids(messages) == ["h2"]
+    assert watermark == "h2"
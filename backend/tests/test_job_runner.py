@@ -0,0 +1,157 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+from rq import Queue
+from rq.job import JobStatus
+
+import job_runner
+from job_runner import ThreadedWorker, check_deadline
+
+
+# Jobs, imported by path by RQ
+def add(a, b):
+    return a + b
+
+
+def fail():
+    raise ValueError("bad input")
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def stream_forever():
+    # Like a chat job: checks its deadline once per chunk
+    while True:
+        check_deadline()
+        time.sleep(0.05)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def queue(redis_server):
+    return Queue("jobs", connection=fakeredis.FakeRedis(server=redis_server))
+
+
+@pytest.fixture
+def start_worker(queue, monkeypatch):
+    """Runs a ThreadedWorker on a thread; stopped (and drained) after the test"""
+    monkeypatch.setattr(job_runner.signal, "signal", lambda *args: None)
+    monkeypatch.setattr(job_runner, "WORKER_DEQUEUE_TIMEOUT_S", 1)
+    started = []
+
+    def start(**kwargs):
+        worker = ThreadedWorker(["jobs"], queue.connection, **kwargs)
+        thread = threading.Thread(target=worker.work, daemon=True)
+        thread.start()
+        started.append((worker, thread))
+        return worker, thread
+
+    yield start
+    for worker, thread in started:
+        if thread.is_alive():
+            worker.request_stop()
+            thread.join(15)
+
+
+def status(job):
+    return job.get_status(refresh=True)
+
+
+def executions(queue):
+    return queue.connection.keys("rq:execution:*")
+
+
+def test_successful_job(queue, start_worker):
+    job = queue.enqueue(add, 1, 2)
+    worker, _ = start_worker()
+    wait_for(lambda: status(job) == JobStatus.FINISHED)
+
+    assert job.return_value() == 3
+    assert job.id in queue.finished_job_registry
+    assert queue.started_job_registry.get_job_ids() == []
+    assert executions(queue) == []
+    assert worker.stats()["completed"] == 1
+
+
+def test_failed_job(queue, start_worker):
+    job = queue.enqueue(fail)
+    worker, _ = start_worker()
+    wait_for(lambda: status(job) == JobStatus.FAILED)
+
+    assert job.id in queue.failed_job_registry
+    assert "ValueError: bad input" in job.latest_result().exc_string
+    assert queue.started_job_registry.get_job_ids() == []
+    assert executions(queue) == []
+    assert worker.stats()["failed"] == 1
+
+
+def test_running_job_is_registered_with_a_heartbeat(queue, start_worker):
+    job = queue.enqueue(sleep, 1)
+    start_worker()
+    wait_for(lambda: status(job) == JobStatus.STARTED)
+
+    assert queue.started_job_registry.get_job_ids() == [job.id]
+    assert len(executions(queue)) == 1
+    assert queue.connection.hget(job.key, "last_heartbeat")
+    wait_for(lambda: status(job) == JobStatus.FINISHED)
+    assert executions(queue) == []
+
+
+def test_job_checking_its_deadline_times_out(queue, start_worker):
+    job = queue.enqueue(stream_forever, job_timeout=1)
+    start_worker()
+    wait_for(lambda: status(job) == JobStatus.FAILED)
+    assert "JobTimeoutException" in job.latest_result().exc_string
+
+
+def test_overdue_job_frees_its_slot(queue, start_worker):
+    overdue = queue.enqueue(sleep, 3, job_timeout=1)
+    worker, _ = start_worker(concurrency=1, overdue_threads=1)
+    wait_for(lambda: status(overdue) == JobStatus.FAILED)
+    assert worker.stats()["overdue"] == 1
+
+    # The only slot is free again while the overdue job still sleeps
+    job = queue.enqueue(add, 2, 2)
+    wait_for(lambda: status(job) == JobStatus.FINISHED, timeout=2.5)
+    assert status(overdue) == JobStatus.FAILED
+    wait_for(lambda: worker.stats()["overdue"] == 0)
+
+
+def test_drain_timeout_fails_running_jobs_and_exits(queue, start_worker, monkeypatch):
+    exits = []
+    monkeypatch.setattr(job_runner, "WORKER_DRAIN_TIMEOUT_S", 0.2)
+    monkeypatch.setattr(job_runner.os, "_exit", exits.append)
+    job = queue.enqueue(sleep, 2)
+    worker, thread = start_worker()
+    wait_for(lambda: status(job) == JobStatus.STARTED)
+
+    worker.request_stop()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert exits == [1]
+    assert status(job) == JobStatus.FAILED
+    assert "Worker shut down" in job.latest_result().exc_string
+
+
+def test_drained_worker_exits_normally(queue, start_worker, monkeypatch):
+    exits = []
+    monkeypatch.setattr(job_runner.os, "_exit", exits.append)
+    job = queue.enqueue(sleep, 0.5)
+    worker, thread = start_worker()
+    wait_for(lambda: status(job) == JobStatus.STARTED)
+
+    worker.request_stop()
+    thread.join(5)
+    assert exits == []
+    assert status(job) == JobStatus.FINISHED
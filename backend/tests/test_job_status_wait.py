@@ -0,0 +1,79 @@
+import asyncio
+
+import fakeredis
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+import worker
+from job_notifier import JobStatusNotifier
+
+
+@pytest.fixture
+def wait_for_jobs(redis_server, redis_client, monkeypatch):
+    """Runs `scenario(post)` on one event loop with the notifier listening"""
+    monkeypatch.setattr(worker, "redis_client", redis_client)
+
+    async def run(scenario):
+        redis = fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True)
+        notifier = JobStatusNotifier(redis.connection_pool)
+        monkeypatch.setattr(server.app.state, "redis", redis, raising=False)
+        monkeypatch.setattr(server.app.state, "job_notifier", notifier, raising=False)
+        await notifier.start()
+        try:
+            # No lifespan: Redis is the fake set above
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                async def post(job_ids, timeout=5):
+                    response = await client.post("/jobs/status/wait", json={"job_ids": job_ids, "timeout": timeout})
+                    assert response.status_code == 200
+                    return response.json()
+                return await scenario(post)
+        finally:
+            await notifier.stop()
+
+    return lambda scenario: asyncio.run(run(scenario))
+
+
+def job_ids(response):
+    return sorted(job["job_id"] for job in response["jobs"])
+
+
+def test_finished_jobs_are_returned_at_once(wait_for_jobs):
+    worker.set_job_status("a", "thread", "completed")
+    worker.set_job_status("b", "thread", "processing")
+
+    response = wait_for_jobs(lambda post: post(["a", "b", "missing"]))
+    assert job_ids(response) == ["a"]
+    assert response["not_found"] == ["missing"]
+
+
+def test_waits_for_a_job_to_finish(wait_for_jobs):
+    worker.set_job_status("a", "thread", "processing")
+    worker.set_job_status("b", "thread", "queued")
+
+    async def scenario(post):
+        waiting = asyncio.create_task(post(["a", "b"]))
+        await asyncio.sleep(0.2)
+        assert not waiting.done()
+        # Not terminal: the request keeps waiting
+        await asyncio.to_thread(worker.set_job_status, "b", "thread", "processing")
+        await asyncio.sleep(0.2)
+        assert not waiting.done()
+        await asyncio.to_thread(worker.set_job_status, "a", "thread", "failed")
+        return await asyncio.wait_for(waiting, 2)
+
+    response = wait_for_jobs(scenario)
+    assert response["jobs"] == [{"job_id": "a", "status": "failed", "thread_id": "thread"}]
+
+
+def test_times_out_with_no_jobs(wait_for_jobs):
+    worker.set_job_status("a", "thread", "processing")
+    response = wait_for_jobs(lambda post: post(["a"], timeout=0.2))
+    assert response == {"jobs": [], "not_found": []}
+
+
+def test_empty_job_ids_are_rejected():
+    response = TestClient(server.app).post("/jobs/status/wait", json={"job_ids": []})
+    assert response.status_code == 400
@@ -0,0 +1,73 @@
+import pytest
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.store.memory import InMemoryStore
+from trustcall import create_extractor
+
+import agent
+from conftest import FakeToolModel
+from llm_cache import LLMCache, LRU_KEY, entry_key
+from memory_cache import MemoryCache
+from storage import LLM_CACHE_STATS_KEY
+
+
+def stats(redis_client):
+    return {field: int(float(value)) for field, value in redis_client.hgetall(LLM_CACHE_STATS_KEY).items()}
+
+
+def test_entry_key_ignores_message_ids():
+    prompt = lambda message_id: dumps([SystemMessage("Reflect"), HumanMessage("buy milk", id=message_id)])
+    assert entry_key(prompt("a"), "model") == entry_key(prompt("b"), "model")
+    assert entry_key(prompt("a"), "model") != entry_key(prompt("a"), "other model")
+
+
+def test_least_recently_used_entries_are_evicted(redis_client):
+    model = FakeToolModel(cache=LLMCache(redis_client, max_entries=2))
+    for text in ["milk", "eggs", "milk", "bread"]:
+        model.invoke([HumanMessage(text)])
+    assert model.calls == 3
+    assert redis_client.zcard(LRU_KEY) == 2
+
+    # "eggs" was the least recently used
+    model.invoke([HumanMessage("milk")])
+    model.invoke([HumanMessage("eggs")])
+    assert model.calls == 4
+    assert stats(redis_client)["hits"] == 2
+
+
+@pytest.fixture
+def todo_extractor(redis_client, monkeypatch):
+    model = FakeToolModel(cache=LLMCache(redis_client))
+    monkeypatch.setattr(agent, "llm_cache_enabled", True)
+    monkeypatch.setattr(agent, "memory_cache", MemoryCache())
+    monkeypatch.setattr(agent, "extractors", {
+        "todo": create_extractor(model, tools=[agent.ToDo], tool_choice="ToDo", enable_inserts=True)
+    })
+    return model
+
+
+def update_todos(user_id):
+    call = {"name": "UpdateMemory", "args": {"update_type": "todo"}, "id": "call-1"}
+    state = {
+        "messages": [HumanMessage("I need to buy milk", id=f"{user_id}-human"),
+                     AIMessage("", tool_calls=[call], id=f"{user_id}-ai")],
+        "tool_calls": [call],
+        "extraction_watermarks": {},
+    }
+    return agent.update_todos(state, {"configurable": {"user_id": user_id}}, InMemoryStore())
+
+
+def test_same_extraction_twice_hits_the_cache(todo_extractor, redis_client):
+    update_todos("user-1")
+    update_todos("user-2")
+    assert todo_extractor.calls == 1
+    assert stats(redis_client)["hits"] == 1
+    assert stats(redis_client)["misses"] == 1
+
+
+def test_trustcall_instruction_is_hourly_only_with_the_cache(monkeypatch):
+    monkeypatch.setattr(agent, "llm_cache_enabled", True)
+    assert agent.trustcall_instruction().endswith(":00")
+    monkeypatch.setattr(agent, "llm_cache_enabled", False)
+    # Seconds and microseconds: relative deadlines stay exact
+    assert agent.trustcall_instruction().count(":") == 3
@@ -0,0 +1,56 @@
+import pytest
+
+import memory_cache
+from memory_cache import MemoryCache
+from storage import snapshot_key
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Users whose memories were loaded from the store"""
+    loads = []
+
+    def load_memories(store, user_id):
+        loads.append(user_id)
+        return {"todo": [memory_cache.MemoryItem("t1", {"task": "Buy milk"})]}
+
+    monkeypatch.setattr(memory_cache, "load_memories", load_memories)
+    return loads
+
+
+def test_current_snapshot_reads_only_the_version(loads, redis_client, monkeypatch):
+    cache = MemoryCache(redis_client)
+    cache.snapshot(None, "user")
+
+    reads = []
+    get = redis_client.get
+    monkeypatch.setattr(redis_client, "get", lambda key: reads.append(key) or get(key))
+    assert cache.snapshot(None, "user").get("todo", "t1").value == {"task": "Buy milk"}
+    assert snapshot_key("user") not in reads
+    assert loads == ["user"]
+
+
+def test_other_workers_reuse_the_shared_snapshot(loads, redis_client):
+    MemoryCache(redis_client).snapshot(None, "user")
+    assert MemoryCache(redis_client).snapshot(None, "user").get("todo", "t1") is not None
+    assert loads == ["user"]
+
+
+def test_write_elsewhere_invalidates_the_local_snapshot(loads, redis_client):
+    cache = MemoryCache(redis_client)
+    cache.snapshot(None, "user")
+    MemoryCache(redis_client).invalidate("user")
+    cache.snapshot(None, "user")
+    assert loads == ["user", "user"]
+
+
+def test_local_snapshots_expire_without_redis(loads, monkeypatch):
+    cache = MemoryCache(local_ttl_s=30)
+    cache.snapshot(None, "user")
+    cache.snapshot(None, "user")
+    assert loads == ["user"]
+
+    expired = memory_cache.time.monotonic() + 31
+    monkeypatch.setattr(memory_cache.time, "monotonic", lambda: expired)
+    cache.snapshot(None, "user")
+    assert loads == ["user", "user"]
@@ -0,0 +1,71 @@
+import fakeredis
+import pytest
+from rq import Queue, SimpleWorker
+from rq.job import Job, JobStatus
+
+import worker
+
+
+@pytest.fixture
+def memory_queue(redis_server, redis_client, monkeypatch):
+    # RQ needs a connection that does not decode responses
+    queue = Queue(worker.MEMORY_QUEUE, connection=fakeredis.FakeRedis(server=redis_server))
+    monkeypatch.setattr(worker, "memory_queue", queue)
+    monkeypatch.setattr(worker, "redis_client", redis_client)
+    return queue
+
+
+@pytest.fixture
+def ran(monkeypatch):
+    """Chat job ids of the memory jobs run, in order; the one for "fail" raises"""
+    ran = []
+
+    def process_memory_job(payload):
+        ran.append(payload["job_id"])
+        if payload["job_id"] == "fail":
+            raise RuntimeError("memory update failed")
+
+    monkeypatch.setattr(worker, "process_memory_job", process_memory_job)
+    return ran
+
+
+def run_jobs(queue):
+    SimpleWorker([queue], connection=queue.connection).work(burst=True)
+
+
+def status(queue, job_id):
+    return Job.fetch(job_id, connection=queue.connection).get_status()
+
+
+def test_memory_jobs_of_a_user_run_in_order(memory_queue, ran):
+    first = worker.schedule_memory_update("a", "thread", "user")
+    second = worker.schedule_memory_update("b", "thread", "user")
+    assert status(memory_queue, second) == JobStatus.DEFERRED
+
+    run_jobs(memory_queue)
+    assert ran == ["a", "b"]
+    assert status(memory_queue, first) == status(memory_queue, second) == JobStatus.FINISHED
+
+
+def test_memory_job_after_a_failed_one_is_not_deferred(memory_queue, ran):
+    failed = worker.schedule_memory_update("fail", "thread", "user")
+    run_jobs(memory_queue)
+    assert status(memory_queue, failed) == JobStatus.FAILED
+
+    second = worker.schedule_memory_update("b", "thread", "user")
+    third = worker.schedule_memory_update("c", "thread", "user")
+    assert status(memory_queue, second) == JobStatus.QUEUED
+    assert status(memory_queue, third) == JobStatus.DEFERRED
+
+    run_jobs(memory_queue)
+    assert ran == ["fail", "b", "c"]
+    assert status(memory_queue, third) == JobStatus.FINISHED
+
+
+def test_failure_while_waiting_does_not_hold_back_the_next_job(memory_queue, ran):
+    worker.schedule_memory_update("fail", "thread", "user")
+    second = worker.schedule_memory_update("b", "thread", "user")
+
+    run_jobs(memory_queue)
+    assert ran == ["fail", "b"]
+    assert status(memory_queue, second) == JobStatus.FINISHED
@@ -0,0 +1,9 @@
+from benchmarks.bench_server_startup import FORBIDDEN, SERVER_IMPORT_BUDGET_MS, import_times, server_imports
+
+
+def test_server_import_stays_lean():
+    # A fresh process: the tests themselves import the agent
+    total_us, imported = server_imports(import_times())
+    forbidden = sorted({name for name, _, _ in imported if name.split(".")[0] in FORBIDDEN})
+    assert forbidden == [], "the server imports worker-only modules"
+    assert total_us / 1000 < SERVER_IMPORT_BUDGET_MS
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+
+import fakeredis
+import pytest
+
+import stream_protocol
+import worker
+from stream_hub import StreamHub
+
+
+@pytest.fixture
+def publisher(redis_client, monkeypatch):
+    monkeypatch.setattr(worker, "redis_client", redis_client)
+    # Long enough that the flush deadline never passes during a test
+    publisher = worker.StreamPublisher("job-1", "thread-1", flush_interval_ms=10000)
+    publisher.start()
+    return publisher
+
+
+def events(redis_client, job_id="job-1"):
+    return [json.loads(fields["data"]) for _, fields in redis_client.xrange(f"job:{job_id}:stream")]
+
+
+def test_first_delta_is_written_at_once(publisher, redis_client):
+    publisher.append("Hello")
+    assert events(redis_client)[-1] == {"type": "chunk", "offset": 0, "delta": "Hello"}
+
+
+def test_deltas_within_the_interval_are_coalesced(publisher, redis_client):
+    publisher.append("Hello")
+    publisher.append(" wor")
+    publisher.append("ld")
+    assert len(events(redis_client)) == 2
+    publisher.flush()
+    assert events(redis_client)[-1] == {"type": "chunk", "offset": 5, "delta": " world"}
+    assert publisher.stats()["chunks_merged"] == 1
+
+
+def test_buffered_text_is_written_at_the_deadline_without_another_delta(redis_client, monkeypatch):
+    monkeypatch.setattr(worker, "redis_client", redis_client)
+    publisher = worker.StreamPublisher("job-1", "thread-1", flush_interval_ms=50)
+    publisher.append("Hello")
+    publisher.append(" world")
+    assert [event["delta"] for event in events(redis_client)] == ["Hello"]
+
+    time.sleep(0.2)
+    assert [event["delta"] for event in events(redis_client)] == ["Hello", " world"]
+    assert events(redis_client)[-1]["offset"] == 5
+
+
+def test_chunks_rebuild_the_reply(publisher, redis_client):
+    # Offsets count UTF-16 code units, so the emoji takes two
+    for delta in ["Buy ", "🥛", " and ", "eggs"]:
+        publisher.append(delta)
+        publisher.flush()
+    publisher.end()
+
+    text = ""
+    for event in events(redis_client):
+        if event["type"] == "chunk":
+            text = stream_protocol.slice_text(text, event["offset"]) + event["delta"]
+    end = events(redis_client)[-1]
+    assert text == end["content"] == "Buy 🥛 and eggs"
+    assert end["length"] == len("Buy  and eggs") + 2
+
+
+def test_resume_replays_only_events_after_last_event_id(publisher, redis_client, redis_server):
+    for delta in ["one ", "two ", "three"]:
+        publisher.append(delta)
+        publisher.flush()
+    publisher.end()
+    ids = [entry_id for entry_id, _ in redis_client.xrange("job:job-1:stream")]
+
+    async def replay(last_id):
+        pool = fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True).connection_pool
+        hub = StreamHub(pool)
+        replayed = []
+        async with hub.subscribe("job-1", last_id) as subscription:
+            while True:
+                try:
+                    entry_id, fields = await subscription.get(timeout=0.1)
+                except asyncio.TimeoutError:
+                    return replayed
+                replayed.append((entry_id, json.loads(fields["data"])))
+
+    replayed = asyncio.run(replay(ids[2]))
+    assert [entry_id for entry_id, _ in replayed] == ids[3:]
+    assert [event["type"] for _, event in replayed] == ["chunk", "end"]
+    assert replayed[0][1] == {"type": "chunk", "offset": 8, "delta": "three"}
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from memory_cache import MemoryItem
+from todo_context import estimate_tokens, render_todo, render_todos, select_todos
+
+NOW = datetime(2026, 10, 1, 9, 0)
+
+
+def todo(key, task, status="not started", deadline=None, solutions=()):
+    return MemoryItem(key, {"task": task, "status": status, "deadline": deadline,
+                            "solutions": list(solutions), "time_to_complete": 30})
+
+
+def keys(items):
+    return [item.key for item in items]
+
+
+def test_most_relevant_todos_come_first():
+    items = [todo("dentist", "Book the dentist"), todo("milk", "Buy milk", solutions=["Corner shop"]),
+             todo("taxes", "File taxes")]
+    assert keys(select_todos(items, "did I buy the milk?", now=NOW))[0] == "milk"
+
+
+def test_close_deadlines_outrank_distant_ones():
+    items = [todo("later", "Renew passport", deadline=(NOW + timedelta(days=60)).isoformat()),
+             todo("soon", "Pay rent", deadline=(NOW + timedelta(hours=5)).isoformat())]
+    assert keys(select_todos(items, "what is next?", now=NOW)) == ["soon", "later"]
+
+
+def test_finished_todos_are_dropped_unless_relevant():
+    items = [todo("milk", "Buy milk", status="done"), todo("taxes", "File taxes", status="archived"),
+             todo("dentist", "Book the dentist")]
+    assert keys(select_todos(items, "buy milk again", now=NOW)) == ["dentist"]
+    assert keys(select_todos(items, "buy milk again", include_finished="if_relevant", now=NOW)) == ["milk", "dentist"]
+
+
+def test_selection_stops_at_the_token_budget():
+    items = [todo(f"t{i}", f"Task number {i}") for i in range(10)]
+    budget = estimate_tokens(render_todo(items[0])) * 3
+    selected = select_todos(items, "task", max_tokens=budget, now=NOW)
+    assert len(selected) == 3
+    assert len(select_todos(items, "task", top_k=2, now=NOW)) == 2
+
+
+def test_an_item_larger_than_the_budget_is_still_selected():
+    item = todo("long", "Plan the trip", solutions=["Book flights and hotels"] * 20)
+    assert keys(select_todos([item], "trip", max_tokens=10, now=NOW)) == ["long"]
+
+
+def test_todos_render_one_line_each():
+    items = [todo("milk", "Buy milk", deadline="2026-10-02T18:00:00", solutions=["Corner shop"])]
+    assert render_todos(items) == "- Buy milk | not started | due 2026-10-02 18:00 | ~30 min | solutions: Corner shop"
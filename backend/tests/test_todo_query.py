@@ -0,0 +1,110 @@
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from todo_query import decode_cursor, deadline_utc, encode_cursor, list_todos, setup_todo_indexes
+
+T0 = datetime(2026, 10, 1, 9, 30, tzinfo=timezone.utc)
+
+
+class FakeConnection:
+    """Returns the rows of a todo list ordered and paged like the SQL query"""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: (row[1], row[0]))
+        self.params = []
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params):
+        self.params.append(params)
+        after = (params.get("after_created_at"), params.get("after_key"))
+        rows = [row for row in self.rows if after[0] is None or (row[1], row[0]) > after]
+        self.result = rows[:params["limit"]]
+
+    def fetchall(self):
+        return self.result
+
+
+def todo_rows(n):
+    # (key, created_at, task): several todos share a created_at
+    return [(f"key-{i:02d}", T0 + timedelta(seconds=i // 3), f"Task {i}") for i in range(n)]
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(T0, "key-1")) == (T0, "key-1")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_cursor(T0, "k")[:-3], "WzFd"])
+def test_malformed_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_pages_follow_the_cursor_to_the_end():
+    conn = FakeConnection(todo_rows(10))
+    seen, cursor = [], None
+    while True:
+        todos, cursor = list_todos(conn, "user", cursor=cursor, limit=4, fields=["task"])
+        seen.extend(todo["id"] for todo in todos)
+        if cursor is None:
+            break
+    assert seen == [f"key-{i:02d}" for i in range(10)]
+    assert len(conn.params) == 3
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError, match="Unknown fields"):
+        list_todos(FakeConnection([]), "user", fields=["task", "owner"])
+
+
+def test_range_bounds_are_compared_in_utc():
+    assert deadline_utc(datetime(2026, 10, 20, 5, tzinfo=timezone(timedelta(hours=-5)))) == datetime(2026, 10, 20, 10)
+    assert deadline_utc(datetime(2026, 10, 20, 10)) == datetime(2026, 10, 20, 10)
+
+
+@pytest.fixture
+def pg():
+    """A Postgres connection with the store table, if TEST_POSTGRES_URL is set"""
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    import psycopg
+    from langgraph.store.postgres import PostgresStore
+
+    with psycopg.connect(url, autocommit=True) as conn:
+        PostgresStore(conn).setup()
+        setup_todo_indexes(conn)
+        yield conn
+
+
+def test_deadline_range_honours_utc_offsets(pg):
+    from psycopg.types.json import Jsonb
+
+    user_id = f"test-{uuid.uuid4()}"
+    deadlines = {
+        "zulu": "2026-10-20T10:00:00Z",
+        "offset": "2026-10-20T05:00:00-05:00",
+        "naive": "2026-10-20T10:00:00",
+        "later": "2026-10-20T10:00:01+00:00",
+        "garbage": "next tuesday",
+    }
+    for key, deadline in deadlines.items():
+        pg.execute("INSERT INTO store (prefix, key, value) VALUES (%s, %s, %s)",
+                   (f"todo.{user_id}", key, Jsonb({"task": key, "deadline": deadline})))
+    try:
+        todos, _ = list_todos(pg, user_id, deadline_to=datetime(2026, 10, 20, 10, tzinfo=timezone.utc))
+        assert sorted(todo["id"] for todo in todos) == ["naive", "offset", "zulu"]
+        todos, _ = list_todos(pg, user_id, deadline_from=datetime(2026, 10, 20, 12, 0, 1, tzinfo=timezone(timedelta(hours=2))))
+        assert [todo["id"] for todo in todos] == ["later"]
+    finally:
+        pg.execute("DELETE FROM store WHERE prefix = %s", (f"todo.{user_id}",))
@@ -0,0 +1,68 @@
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from memory_cache import MemoryCache
+from storage import version_key
+
+
+@pytest.fixture
+def queries(redis_server, monkeypatch):
+    """Requests that reached Postgres"""
+    queries = []
+
+    def list_todos(request):
+        queries.append(request)
+        return [], None
+
+    monkeypatch.setattr(server, "TODOS_CACHE_ENABLED", True)
+    monkeypatch.setattr(server.app.state, "redis",
+                        fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True), raising=False)
+    monkeypatch.setattr(server, "_list_todos_sync", list_todos)
+    return queries
+
+
+@pytest.fixture
+def get_todos(queries):
+    # No lifespan: Redis is the fake set above and Postgres is never reached
+    client = TestClient(server.app)
+    return lambda etag=None: client.post("/todos/get", json={"user_id": "user"},
+                                         headers={"If-None-Match": etag} if etag else {})
+
+
+def test_unchanged_todos_are_not_modified(get_todos, queries):
+    etag = get_todos().headers["ETag"]
+    response = get_todos(etag)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert get_todos().status_code == 200
+    assert len(queries) == 1
+
+
+def test_memory_write_changes_the_etag(get_todos, queries, redis_client):
+    etag = get_todos().headers["ETag"]
+    MemoryCache(redis_client).invalidate("user")
+
+    response = get_todos(etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(queries) == 2
+
+
+def test_etag_does_not_survive_a_lost_version_key(get_todos, redis_client):
+    etag = get_todos().headers["ETag"]
+    redis_client.flushall()
+
+    response = get_todos(etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_recreated_version_key_starts_at_a_random_version(redis_client):
+    cache = MemoryCache(redis_client)
+    cache.invalidate("user")
+    first = int(redis_client.get(version_key("user")))
+    redis_client.delete(version_key("user"))
+    cache.invalidate("user")
+    assert int(redis_client.get(version_key("user"))) not in (1, first)
@@ -0,0 +1,145 @@
+# todo_context.py
+
+"""
+Builds the ToDo context handed to the chat model and to Trustcall.
+
+Instead of every stored todo as a dict repr, the context holds the todos
+most relevant to the conversation: unfinished items ranked by a local BM25
+index over `task` and `solutions` plus deadline proximity, cut to a token
+budget and rendered one compact line per item.
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from datetime import datetime
+
+# Todos fetched from the store per user before ranking
+TODO_CONTEXT_CANDIDATES = int(os.getenv("TODO_CONTEXT_CANDIDATES", 1000))
+TODO_CONTEXT_TOP_K = int(os.getenv("TODO_CONTEXT_TOP_K", 20))
+TODO_CONTEXT_MAX_TOKENS = int(os.getenv("TODO_CONTEXT_MAX_TOKENS", 800))
+# Weight of deadline proximity relative to the (normalized) BM25 score
+TODO_CONTEXT_DEADLINE_WEIGHT = float(os.getenv("TODO_CONTEXT_DEADLINE_WEIGHT", 0.5))
+
+FINISHED_STATUSES = ("done", "archived")
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token"""
+    return math.ceil(len(text) / 4)
+
+
+def todo_text(todo: dict) -> str:
+    return " ".join([todo.get("task") or ""] + list(todo.get("solutions") or []))
+
+
+def bm25_scores(query: str, documents):
+    """BM25 score of every document (a string) for the query"""
+    query_terms = set(tokenize(query))
+    docs = [Counter(tokenize(doc)) for doc in documents]
+    if not docs or not query_terms:
+        return [0.0] * len(docs)
+
+    avg_len = sum(sum(doc.values()) for doc in docs) / len(docs) or 1
+    doc_freq = Counter(term for doc in docs for term in query_terms if term in doc)
+
+    scores = []
+    for doc in docs:
+        doc_len = sum(doc.values())
+        score = 0.0
+        for term in query_terms:
+            tf = doc.get(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(docs) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc_len / avg_len))
+        scores.append(score)
+    return scores
+
+
+def deadline_score(deadline, now: datetime) -> float:
+    """1 for overdue or due now, decaying with the number of days left"""
+    if not deadline:
+        return 0.0
+    try:
+        due = datetime.fromisoformat(deadline) if isinstance(deadline, str) else deadline
+    except ValueError:
+        return 0.0
+    if due.tzinfo is not None:
+        # Compare in local time, like the naive deadlines the model writes
+        due = due.astimezone().replace(tzinfo=None)
+    days_left = (due - now).total_seconds() / 86400
+    return 1.0 / (1.0 + max(days_left, 0.0))
+
+
+def select_todos(items, query: str, top_k: int = TODO_CONTEXT_TOP_K,
+                 max_tokens: int = TODO_CONTEXT_MAX_TOKENS,
+                 include_finished: str = "never", now: datetime = None):
+    """
+    Pick the store items (from the ("todo", user_id) namespace) that belong
+    in the context for `query`, most relevant first.
+
+    include_finished is "never" to drop done/archived items, or "if_relevant"
+    to keep those that lexically match the query, e.g. so the user can reopen
+    a finished task.
+    """
+    if now is None:
+        now = datetime.now()
+
+    items = list(items)
+    relevance = bm25_scores(query, [todo_text(item.value) for item in items])
+    top_relevance = max(relevance, default=0.0) or 1.0
+
+    ranked = []
+    for item, score in zip(items, relevance):
+        if item.value.get("status") in FINISHED_STATUSES:
+            if include_finished == "never" or score == 0:
+                continue
+        rank = score / top_relevance + TODO_CONTEXT_DEADLINE_WEIGHT * deadline_score(item.value.get("deadline"), now)
+        ranked.append((rank, item))
+    ranked.sort(key=lambda pair: pair[0], reverse=True)
+
+    selected, used_tokens = [], 0
+    for _, item in ranked[:top_k]:
+        item_tokens = estimate_tokens(render_todo(item))
+        if selected and used_tokens + item_tokens > max_tokens:
+            break
+        selected.append(item)
+        used_tokens += item_tokens
+    return selected
+
+
+def format_deadline(deadline) -> str:
+    try:
+        due = datetime.fromisoformat(deadline) if isinstance(deadline, str) else deadline
+        return due.strftime("%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        return str(deadline)
+
+
+def render_todo(item) -> str:
+    todo = item.value
+    parts = [todo.get("task") or "", todo.get("status") or "not started"]
+    if todo.get("deadline"):
+        parts.append(f"due {format_deadline(todo['deadline'])}")
+    if todo.get("time_to_complete"):
+        parts.append(f"~{todo['time_to_complete']} min")
+    if todo.get("solutions"):
+        parts.append("solutions: " + "; ".join(todo["solutions"]))
+    return "- " + " | ".join(parts)
+
+
+def render_todos(items) -> str:
+    """One compact line per todo"""
+    return "\n".join(render_todo(item) for item in items)
@@ -0,0 +1,144 @@
+# todo_query.py
+
+"""
+Filtered, paginated listing of a user's todos for /todos/get.
+
+Todos live in the LangGraph store table as JSON values under the prefix
+"todo.<user_id>". A page is one SQL query on that table: optional filters
+on status, deadline range and a case-insensitive text match on task and
+solutions, ordered by (created_at, key) with keyset pagination. Updating a
+todo does not change its created_at, so a cursor stays valid while the
+list is edited. setup_todo_indexes() creates the indexes the query uses.
+
+Deadlines are stored as ISO 8601 strings, with or without a UTC offset.
+They are compared in UTC through todo_deadline_utc(), an immutable SQL
+function with an expression index: a deadline with an offset is converted
+to UTC, and one without is taken as UTC. The range bounds are normalized
+the same way. A deadline that does not parse never matches a range.
+"""
+
+import base64
+import json
+import os
+from datetime import datetime, timezone
+
+from psycopg import sql
+
+TODO_FIELDS = ("task", "time_to_complete", "deadline", "solutions", "status")
+TODOS_PAGE_DEFAULT = int(os.getenv("TODOS_PAGE_DEFAULT", 100))
+TODOS_PAGE_MAX = int(os.getenv("TODOS_PAGE_MAX", 1000))
+
+# A stored deadline as a UTC timestamp, or NULL if it does not parse. The
+# text to timestamptz cast is not immutable (it reads the session time zone
+# for strings without an offset), so those are cast to timestamp instead.
+TODO_DEADLINE_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION todo_deadline_utc(deadline text) RETURNS timestamp
+LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+BEGIN
+    IF deadline ~ '[T ]\d\d:\d\d(:\d\d(\.\d+)?)?(Z|[+-]\d\d(:?\d\d)?)$' THEN
+        RETURN deadline::timestamptz AT TIME ZONE 'UTC';
+    END IF;
+    RETURN deadline::timestamp;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END
+$$
+"""
+
+# The store table is LangGraph's; these only add indexes to it. The first
+# serves unfiltered pages, the second status filters, the third deadline ranges.
+TODO_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS store_todo_page_idx ON store (prefix, created_at, key)",
+    "CREATE INDEX IF NOT EXISTS store_todo_status_idx ON store (prefix, (value->>'status'), created_at, key)",
+    "CREATE INDEX IF NOT EXISTS store_todo_deadline_utc_idx ON store (prefix, todo_deadline_utc(value->>'deadline'))",
+    # Compared deadlines as strings; replaced by the one above
+    "DROP INDEX IF EXISTS store_todo_deadline_idx",
+)
+
+
+def setup_todo_indexes(conn):
+    conn.execute(TODO_DEADLINE_FUNCTION)
+    for statement in TODO_INDEXES:
+        conn.execute(statement)
+
+
+def deadline_utc(deadline: datetime) -> datetime:
+    """A range bound as todo_deadline_utc() sees deadlines: naive UTC"""
+    if deadline.tzinfo is not None:
+        deadline = deadline.astimezone(timezone.utc).replace(tzinfo=None)
+    return deadline
+
+
+def encode_cursor(created_at: datetime, key: str) -> str:
+    raw = json.dumps([created_at.isoformat(), key]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """(created_at, key) of the last todo of the previous page; ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, key = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(key)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def list_todos(conn, user_id: str, status=None, deadline_from=None, deadline_to=None,
+               text=None, cursor=None, limit=TODOS_PAGE_DEFAULT, fields=None):
+    """
+    One page of a user's todos as (todos, next_cursor). Each todo is a dict
+    with "id" and the requested fields (all of TODO_FIELDS by default);
+    next_cursor is None on the last page.
+    """
+    fields = list(fields or TODO_FIELDS)
+    unknown = set(fields) - set(TODO_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    conditions = [sql.SQL("prefix = %(prefix)s")]
+    params = {"prefix": f"todo.{user_id}", "limit": limit + 1}
+    if status:
+        conditions.append(sql.SQL("value->>'status' = ANY(%(status)s)"))
+        params["status"] = list(status)
+    if deadline_from is not None:
+        conditions.append(sql.SQL("todo_deadline_utc(value->>'deadline') >= %(deadline_from)s"))
+        params["deadline_from"] = deadline_utc(deadline_from)
+    if deadline_to is not None:
+        conditions.append(sql.SQL("todo_deadline_utc(value->>'deadline') <= %(deadline_to)s"))
+        params["deadline_to"] = deadline_utc(deadline_to)
+    if text:
+        conditions.append(sql.SQL("(value->>'task' ILIKE %(text)s OR value->>'solutions' ILIKE %(text)s)"))
+        params["text"] = _like_pattern(text)
+    if cursor:
+        params["after_created_at"], params["after_key"] = decode_cursor(cursor)
+        conditions.append(sql.SQL("(created_at, key) > (%(after_created_at)s, %(after_key)s)"))
+
+    query = sql.SQL(
+        "SELECT key, created_at, {columns} FROM store WHERE {conditions} "
+        "ORDER BY created_at, key LIMIT %(limit)s"
+    ).format(
+        columns=sql.SQL(", ").join(
+            sql.SQL("value->{} AS {}").format(sql.Literal(field), sql.Identifier(field)) for field in fields
+        ),
+        conditions=sql.SQL(" AND ").join(conditions),
+    )
+
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+
+    todos = [
+        {"id": key, **{field: value for field, value in zip(fields, values)}}
+        for key, _, *values in rows[:limit]
+    ]
+    for todo in todos:
+        if "solutions" in todo and todo["solutions"] is None:
+            todo["solutions"] = []
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return todos, next_cursor
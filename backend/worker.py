@@ -1,10 +1,23 @@
 # worker.py
 
+import heapq
+import itertools
 import redis
-import json
+import threading
+import time
+import uuid
 from datetime import datetime
 from langchain_core.messages import HumanMessage
-from agent import graph
+from rq import Queue
+from rq.exceptions import NoSuchJobError
+from rq.job import Dependency, Job, JobStatus
+import stream_protocol
+import agent
+from agent import MEMORY_UPDATES
+from agent import warmup as warmup_agent
+from storage import get_checkpointer
+from checkpointer import compact_thread, sweep_expired_threads
+from job_runner import ThreadedWorker, check_deadline
 from dotenv import load_dotenv
 import os
 
@@ -14,29 +27,364 @@ load_dotenv()
 # Redis connection
 redis_client = redis.Redis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=os.getenv("REDIS_DB"), decode_responses=True)
 
-def publish_to_stream(job_id: str, event_type: str, content: str = None, error: str = None, **kwargs):
+STREAM_TTL = 3600
+# At most one worker sweeps expired checkpoint threads per interval
+CHECKPOINT_SWEEP_INTERVAL_S = int(os.getenv("CHECKPOINT_SWEEP_INTERVAL_S", 3600))
+# Coalescing window for chunk events: flush when either limit is reached
+STREAM_FLUSH_INTERVAL_MS = float(os.getenv("STREAM_FLUSH_INTERVAL_MS", 20))
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", 512))
+
+# Deferred memory updates (MEMORY_UPDATES=deferred) run as follow-up jobs on
+# this queue. Workers listen on it after chat_jobs, so it has lower priority:
+#   python worker.py chat_jobs memory_jobs
+MEMORY_QUEUE = "memory_jobs"
+MEMORY_JOB_TIMEOUT = "5m"
+MEMORY_JOB_LOCK_TIMEOUT_S = 300
+
+# RQ stores pickled job data, so its connection must not decode responses
+memory_queue = Queue(MEMORY_QUEUE, connection=redis.Redis(
+    host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=os.getenv("REDIS_DB")
+))
+
+def publish_to_stream(job_id: str, event: dict):
     """
-    Publish events to Redis Stream for the job
+    Publish a single protocol event to the Redis Stream for the job, unbuffered
     """
     stream_key = f"job:{job_id}:stream"
-    
-    event_data = {
-        "type": event_type,
-        "timestamp": datetime.now().isoformat(),
-        "job_id": job_id,
-        **kwargs
-    }
-    
-    if content:
-        event_data["content"] = content
-    if error:
-        event_data["error"] = error
-    
-    # Add to Redis Stream
-    redis_client.xadd(stream_key, {"data": json.dumps(event_data)})
-    
-    # Set TTL on stream (1 hour)
-    redis_client.expire(stream_key, 3600)
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.xadd(stream_key, stream_protocol.encode(event))
+        pipe.expire(stream_key, STREAM_TTL)
+        pipe.execute()
+
+class FlushScheduler:
+    """
+    One daemon thread per process that flushes publishers whose buffered
+    text is due, so a pause in the model's output never holds text back
+    longer than the flush interval.
+    """
+
+    def __init__(self):
+        self._due = []  # heap of (deadline, seq, publisher)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, publisher: "StreamPublisher", deadline: float):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stream-flush", daemon=True)
+                self._thread.start()
+            heapq.heappush(self._due, (deadline, next(self._seq), publisher))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    self._cond.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                _, _, publisher = heapq.heappop(self._due)
+            try:
+                publisher.flush_due()
+            except Exception as e:
+                print(f"Stream flush for job {publisher.job_id} failed: {e}")
+
+flush_scheduler = FlushScheduler()
+
+class StreamPublisher:
+    """
+    Per-job buffered publisher for the job's Redis Stream.
+
+    Speaks the delta protocol in stream_protocol.py: at most one chunk event
+    is written per STREAM_FLUSH_INTERVAL_MS. A delta appended when no chunk has
+    been written for that long goes out at once, so the first token is never
+    held back; deltas arriving sooner are buffered, then written as one chunk
+    event with a single pipelined XADD once STREAM_FLUSH_BYTES are pending or
+    the interval has passed. The latter is a deadline: FlushScheduler writes
+    the buffer then even if no further delta arrives. Call flush() before any
+    step that may block the stream. The stream TTL is set once by start(),
+    and end/error events always flush immediately.
+    """
+
+    def __init__(self, job_id: str, thread_id: str,
+                 flush_interval_ms: float = STREAM_FLUSH_INTERVAL_MS,
+                 flush_bytes: int = STREAM_FLUSH_BYTES):
+        self.job_id = job_id
+        self.thread_id = thread_id
+        self.stream_key = f"job:{job_id}:stream"
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_bytes = flush_bytes
+
+        # Full reply so far, and the offset up to which it has been published
+        self._text = []
+        self._offset = 0
+        self._pending = []
+        self._pending_bytes = 0
+        # When the last chunk event was written; the first delta goes out at once
+        self._last_chunk = float("-inf")
+        # Whether FlushScheduler holds a deadline for the buffer. The lock
+        # guards the buffer against its thread.
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+
+        # Counters for tuning time-to-first-token vs. Redis ops per second
+        self.chunks_received = 0
+        self.chunks_merged = 0
+        self.events_written = 0
+        self.flushes = 0
+        self.ended = False
+
+    @property
+    def text(self):
+        return "".join(self._text)
+
+    def start(self, content: str = None):
+        """Publish the start event and set the stream TTL once for the whole job"""
+        with redis_client.pipeline(transaction=False) as pipe:
+            self._xadd(pipe, stream_protocol.start_event(self.job_id, self.thread_id, content))
+            pipe.expire(self.stream_key, STREAM_TTL)
+            pipe.execute()
+        self.flushes += 1
+
+    def append(self, delta: str):
+        """Buffer text appended to the reply, flushing once the interval since the last chunk has passed"""
+        if not delta:
+            return
+        with self._lock:
+            self.chunks_received += 1
+            self._text.append(delta)
+            self._pending.append(delta)
+            self._pending_bytes += len(delta.encode("utf-8"))
+
+            if (self._pending_bytes >= self.flush_bytes
+                    or time.monotonic() - self._last_chunk >= self.flush_interval):
+                self._flush()
+            elif not self._flush_scheduled:
+                self._flush_scheduled = True
+                flush_scheduler.schedule(self, self._last_chunk + self.flush_interval)
+
+    def flush(self):
+        """Write any buffered text as a single chunk event"""
+        with self._lock:
+            self._flush()
+
+    def flush_due(self):
+        """Called by FlushScheduler at the deadline of the buffered text"""
+        with self._lock:
+            self._flush_scheduled = False
+            if not self._pending or self.ended:
+                return
+            due = self._last_chunk + self.flush_interval
+            if time.monotonic() < due:
+                # A flush since scheduling moved the deadline
+                self._flush_scheduled = True
+                flush_scheduler.schedule(self, due)
+                return
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with redis_client.pipeline(transaction=False) as pipe:
+            self._xadd_pending(pipe)
+            pipe.execute()
+        self.flushes += 1
+        self._last_chunk = time.monotonic()
+
+    def end(self, memory_update: str = None):
+        """
+        Publish the end event with the full reply. Buffered deltas are folded
+        into it rather than written as a separate chunk.
+        """
+        with self._lock:
+            if self.ended:
+                return
+            self.ended = True
+            if self._pending:
+                self.chunks_merged += len(self._pending)
+                self._clear_pending()
+            with redis_client.pipeline(transaction=False) as pipe:
+                self._xadd(pipe, stream_protocol.end_event(self.text, memory_update))
+                pipe.execute()
+            self.flushes += 1
+
+    def error(self, error: str):
+        """Flush buffered text and publish the error event"""
+        with self._lock:
+            with redis_client.pipeline(transaction=False) as pipe:
+                if self._pending:
+                    self._xadd_pending(pipe)
+                self._xadd(pipe, stream_protocol.error_event(error))
+                pipe.execute()
+            self.flushes += 1
+
+    def stats(self):
+        return {
+            "chunks_received": self.chunks_received,
+            "chunks_merged": self.chunks_merged,
+            "events_written": self.events_written,
+            "flushes": self.flushes
+        }
+
+    def _xadd_pending(self, pipe):
+        # n buffered deltas become one chunk event
+        self.chunks_merged += len(self._pending) - 1
+        delta = "".join(self._pending)
+        self._xadd(pipe, stream_protocol.chunk_event(self._offset, delta))
+        self._offset += stream_protocol.text_length(delta)
+        self._clear_pending()
+
+    def _clear_pending(self):
+        self._pending = []
+        self._pending_bytes = 0
+
+    def _xadd(self, pipe, event: dict):
+        pipe.xadd(self.stream_key, stream_protocol.encode(event))
+        self.events_written += 1
+
+def set_job_status(job_id: str, thread_id: str, status: str, **fields):
+    """
+    Update the job's meta hash and announce the transition on the status
+    channel in one round trip
+    """
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hset(f"job:{job_id}:meta", mapping={"status": status, **fields})
+        pipe.publish(
+            stream_protocol.JOB_STATUS_CHANNEL,
+            stream_protocol.dumps(stream_protocol.status_event(job_id, status, thread_id))
+        )
+        pipe.execute()
+
+def maintain_checkpoints(thread_id: str):
+    """
+    Keep the thread's stored checkpoints bounded, and sweep idle threads if
+    no other worker has done so within CHECKPOINT_SWEEP_INTERVAL_S
+    """
+    try:
+        size = compact_thread(get_checkpointer(), thread_id)
+        if size is not None:
+            print(f"Thread {thread_id} checkpoints compacted ({size} bytes)")
+        if redis_client.set("checkpoints:sweep", 1, nx=True, ex=CHECKPOINT_SWEEP_INTERVAL_S):
+            swept = sweep_expired_threads(get_checkpointer())
+            print(f"Swept {swept} expired checkpoint threads")
+    except Exception as e:
+        print(f"Checkpoint maintenance failed for thread {thread_id}: {e}")
+
+# Statuses of a memory job that has yet to finish
+PENDING_STATUSES = (JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED, JobStatus.STARTED)
+
+def pending_job(job_id: str):
+    """The memory job if it has not run yet or is running, else None"""
+    if not job_id:
+        return None
+    try:
+        job = Job.fetch(job_id, connection=memory_queue.connection)
+    except NoSuchJobError:
+        return None
+    return job if job.get_status() in PENDING_STATUSES else None
+
+def schedule_memory_update(job_id: str, thread_id: str, user_id: str, checkpoint_id: str = None):
+    """
+    Enqueue the follow-up memory job for a chat job. Jobs of the same user
+    run in submission order: each depends on the user's previous memory job
+    while that one is still pending.
+    """
+    memory_job_id = str(uuid.uuid4())
+    previous = pending_job(redis_client.set(f"memory:{user_id}:last_job", memory_job_id, ex=STREAM_TTL, get=True))
+    job = memory_queue.enqueue(
+        "worker.process_memory_job",
+        {
+            "job_id": job_id,
+            "thread_id": thread_id,
+            "user_id": user_id,
+            "checkpoint_id": checkpoint_id,
+        },
+        job_id=memory_job_id,
+        job_timeout=MEMORY_JOB_TIMEOUT,
+        # RQ keeps a job deferred if it depends on one that has already
+        # failed, so only pending jobs are depended on. allow_failure: a
+        # failure while this one waits must not hold it back either.
+        depends_on=Dependency(jobs=[previous.id], allow_failure=True) if previous else None
+    )
+    # The previous job may have failed or been stopped between the check and
+    # the enqueue, after RQ released its dependents
+    if previous and job.get_status() == JobStatus.DEFERRED and pending_job(previous.id) is None:
+        memory_queue.enqueue_dependents(previous)
+    return memory_job_id
+
+def process_memory_job(job_payload):
+    """
+    Update long-term memory from a finished chat turn (deferred mode), then
+    publish memory_updated to the chat job's stream
+    """
+    job_id = job_payload["job_id"]
+    user_id = job_payload["user_id"]
+    config = {"configurable": {"thread_id": job_payload["thread_id"], "user_id": user_id}}
+
+    try:
+        # Already built at startup by python worker.py; under rq worker the
+        # first job of each work-horse builds it
+        agent.build()
+
+        # Dependencies order the user's jobs; the lock also covers a job
+        # enqueued while its predecessor was still being submitted
+        with redis_client.lock(f"memory:{user_id}:lock", timeout=MEMORY_JOB_LOCK_TIMEOUT_S):
+            # The thread as of the chat turn, or its latest state if compaction
+            # has already removed that checkpoint
+            state = None
+            if job_payload.get("checkpoint_id"):
+                state = agent.graph.get_state({"configurable": {**config["configurable"], "checkpoint_id": job_payload["checkpoint_id"]}})
+            if state is None or not state.values:
+                state = agent.graph.get_state(config)
+            messages = state.values.get("messages", [])
+            # Watermarks only move forward, so the latest ones are the best
+            # record of what earlier memory jobs have already extracted
+            latest = agent.graph.get_state(config)
+            watermarks = latest.values.get("extraction_watermarks") or {}
+
+            result = agent.memory_graph.invoke(
+                {
+                    "messages": messages,
+                    "summary": state.values.get("summary", ""),
+                    "extraction_watermarks": watermarks
+                },
+                config
+            )
+
+            # Record the new watermarks on the thread; task_mAIstro's reply
+            # has no tool calls, so the thread stays finished
+            if result.get("extraction_watermarks", {}) != watermarks:
+                agent.graph.update_state(config, {"extraction_watermarks": result["extraction_watermarks"]}, as_node="task_mAIstro")
+
+        updates = sorted({
+            tool_call["args"]["update_type"]
+            for message in result["messages"][len(messages):]
+            for tool_call in getattr(message, "tool_calls", None) or []
+        })
+        redis_client.hset(f"job:{job_id}:meta", "memory_update", "completed")
+        publish_to_stream(job_id, stream_protocol.memory_updated_event(updates))
+        return {"status": "success", "updates": updates}
+
+    except Exception as e:
+        redis_client.hset(f"job:{job_id}:meta", "memory_update", "failed")
+        publish_to_stream(job_id, stream_protocol.memory_updated_event(error=str(e)))
+        raise Exception(f"Memory update for job {job_id} failed: {e}")
+
+def new_text(content, accumulated: str) -> str:
+    """
+    Text a streamed message chunk appends to the reply. Most providers stream
+    deltas, but some resend the accumulated text, so strip it if present.
+    """
+    if isinstance(content, list):
+        # Multi-part content: keep the text parts only
+        content = "".join(
+            part if isinstance(part, str) else part.get("text", "")
+            for part in content
+        )
+    if not content:
+        return ""
+    if accumulated and content.startswith(accumulated):
+        return content[len(accumulated):]
+    return content
 
 def process_chat_job(job_payload):
     """
@@ -48,17 +396,19 @@ def process_chat_job(job_payload):
     message = job_payload["message"]
     job_type = job_payload["job_type"]
     
+    publisher = StreamPublisher(job_id, thread_id)
+    # Announced on the end event so readers wait for memory_updated
+    memory_update = "pending" if MEMORY_UPDATES == "deferred" else None
+
     try:
+        # Already built at startup by python worker.py (see process_memory_job)
+        agent.build()
+
         # Update job status to running
-        redis_client.hset(f"job:{job_id}:meta", "status", "running")
+        set_job_status(job_id, thread_id, "running")
         
         # Publish start event
-        publish_to_stream(
-            job_id, 
-            "start", 
-            content="Processing your message...",
-            thread_id=thread_id
-        )
+        publisher.start(content="Processing your message...")
         
         # Create config for the graph
         config = {
@@ -72,16 +422,22 @@ def process_chat_job(job_payload):
         input_messages = [HumanMessage(content=message)]
         
         # Process through the graph
-        full_response = ""
         chunk_count = 0
+        message_id, message_text = None, ""
 
-        for chunk in graph.stream({"messages": input_messages}, config, stream_mode="messages"):
+        for chunk in agent.graph.stream({"messages": input_messages}, config, stream_mode="messages"):
+            # Enforces job_timeout when jobs run on ThreadedWorker threads
+            check_deadline()
             print(f"Processing chunk {chunk_count}: {chunk}\n")
             # Each chunk is a tuple: (AIMessageChunk, metadata_dict)
             if isinstance(chunk, tuple) and hasattr(chunk[0], "content"):
-                #print(f"Chunk {chunk_count}: {chunk[0]}\n")
-                msg_obj = chunk[0]
-                content = msg_obj.content
+                msg_obj, chunk_meta = chunk
+                # Only the chat node talks to the user; extractor and
+                # instruction-update calls are internal, and the reply so far
+                # must not wait behind them
+                if chunk_meta.get("langgraph_node") != "task_mAIstro":
+                    publisher.flush()
+                    continue
                 metadata = getattr(msg_obj, "response_metadata", {})
                 is_tool_call = bool(getattr(msg_obj, "tool_calls", None))
                 is_end = False
@@ -93,41 +449,53 @@ def process_chat_job(job_payload):
                     # For Gemini, finish_reason is used
                     #print("llm provider is google_genai\n\n")
                     is_end = metadata.get("finish_reason") == "STOP" and not is_tool_call
-                
-
-                print(f"Chunk {chunk_count}: {content} | End: {is_end}")
-
-                # Only publish if content changed
-                if content != full_response:
-                    publish_to_stream(
-                        job_id,
-                        "end" if is_end else "chunk",
-                        content=content,
-                        thread_id=thread_id,
-                        chunk_id=chunk_count,
-                        final=is_end
-                    )
-                    full_response = content
-                    chunk_count += 1
+
+                if msg_obj.id != message_id:
+                    message_id, message_text = msg_obj.id, ""
+                delta = new_text(msg_obj.content, message_text)
+                message_text += delta
+                print(f"Chunk {chunk_count}: {delta} | End: {is_end}")
+
+                publisher.append(delta)
+                chunk_count += 1
+                if is_end:
+                    publisher.end(memory_update)
+                elif is_tool_call:
+                    # The graph moves on to the memory update nodes
+                    publisher.flush()
             else:
                 print(f"Chunk {chunk_count}: (no content found)")
 
-        # Publish completion event if not already published as end
-        # final_content = full_response or "I received your message and I'm ready to help with your tasks!"
-        # publish_to_stream(
-        #     job_id,
-        #     "end",
-        #     content=final_content,
-        #     thread_id=thread_id,
-        #     final=True
-        # )
-        
+        # The provider never signalled a final chunk; end the stream anyway
+        if not publisher.ended:
+            publisher.end(memory_update)
+        full_response = publisher.text
+        stats = publisher.stats()
+        print(f"Job {job_id} stream stats: {stats}")
+
+        if memory_update:
+            # The reply is out; memory is updated by a follow-up job
+            try:
+                checkpoint_id = agent.graph.get_state(config).config["configurable"].get("checkpoint_id")
+                stats["memory_job_id"] = schedule_memory_update(job_id, thread_id, user_id, checkpoint_id)
+            except Exception as e:
+                publish_to_stream(job_id, stream_protocol.memory_updated_event(error=str(e)))
+                stats["memory_update"] = "failed"
+            else:
+                stats["memory_update"] = "pending"
+
         # Update job status to completed
-        redis_client.hset(f"job:{job_id}:meta", mapping={
-            "status": "completed",
-            "completed_at": datetime.now().isoformat(),
-            "result": full_response
-        })
+        set_job_status(
+            job_id,
+            thread_id,
+            "completed",
+            completed_at=datetime.now().isoformat(),
+            result=full_response,
+            **stats
+        )
+
+        # After the reply is delivered, so it never adds to user latency
+        maintain_checkpoints(thread_id)
         
         return {"status": "success", "result": full_response}
         
@@ -135,21 +503,33 @@ def process_chat_job(job_payload):
         error_msg = str(e)
         
         # Publish error event
-        publish_to_stream(
-            job_id,
-            "error",
-            error=error_msg,
-            thread_id=thread_id
-        )
+        publisher.error(error_msg)
         
         # Update job status to failed
-        redis_client.hset(f"job:{job_id}:meta", mapping={
-            "status": "failed",
-            "failed_at": datetime.now().isoformat(),
-            "error": error_msg
-        })
+        set_job_status(
+            job_id,
+            thread_id,
+            "failed",
+            failed_at=datetime.now().isoformat(),
+            error=error_msg
+        )
         
         raise Exception(f"Job {job_id} failed: {error_msg}")
 
+def warmup():
+    """Open every connection a job uses and check the agent is ready"""
+    started = time.monotonic()
+    warmup_agent()
+    redis_client.ping()
+    memory_queue.connection.ping()
+    print(f"Worker warm in {time.monotonic() - started:.2f}s")
+
 if __name__ == "__main__":
-    print("Worker module loaded. Use 'rq worker' command to start the worker.")
+    # Jobs run concurrently on threads of this process instead of a fork per
+    # job, so every job reuses the graph, extractors and connections built
+    # and warmed up here (see job_runner.py)
+    import sys
+
+    queues = sys.argv[1:] or ["chat_jobs", MEMORY_QUEUE]
+    warmup()
+    ThreadedWorker(queues, connection=memory_queue.connection).work()
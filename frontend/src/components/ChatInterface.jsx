@@ -67,16 +67,13 @@ const ChatInterface = ({ userId, onTodoUpdate, isOpen, onToggle }) => {
               //setStreamingMessage('🤔 Thinking...');
               break;
             case 'chunk':
-              setStreamingMessage(prev => {
-                const updated = (prev || "") + data.content;
-                streamingMessageRef.current = updated;
-                return updated;
-              });
-              console.log('Received chunk:', data.content);
+              // data.text is the reply reassembled so far by the API client
+              streamingMessageRef.current = data.text;
+              setStreamingMessage(data.text);
+              console.log('Received chunk:', data.delta);
               break;
             case 'end':
-              // Use the ref to get the latest value
-              const finalContent = streamingMessageRef.current + (data.content || "");
+              const finalContent = data.text;
               setMessages(prev => [...prev, { role: 'assistant', content: finalContent }]);
               setStreamingMessage('');
               setIsLoading(false);
@@ -85,6 +82,10 @@ const ChatInterface = ({ userId, onTodoUpdate, isOpen, onToggle }) => {
               onTodoUpdate();
               streamingMessageRef.current = '';
               break;
+            case 'memory_updated':
+              // Deferred memory update finished after the reply
+              onTodoUpdate();
+              break;
           }
         },
         (error) => {
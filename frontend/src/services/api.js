@@ -11,11 +11,35 @@ const api = axios.create({
   },
 });
 
+// Last /todos/get result per user, with the ETag of its first page
+const todoCache = new Map();
+
 export const todoAPI = {
-  // Get user todos (unchanged)
+  // Get all of a user's todos, following the pagination cursor. The first
+  // page is revalidated with its ETag: while it is unchanged (304), so are
+  // the others, and the previous result is reused.
   getUserTodos: async (userId) => {
-    const response = await api.post('/todos/get', { user_id: userId });
-    return response.data;
+    const previous = todoCache.get(userId);
+    const todos = [];
+    let cursor = null;
+    let etag = null;
+    do {
+      const response = await api.post('/todos/get', { user_id: userId, cursor, limit: 1000 }, {
+        headers: !cursor && previous ? { 'If-None-Match': previous.etag } : {},
+        validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+      });
+      if (response.status === 304) {
+        return previous.data;
+      }
+      etag = etag || response.headers.etag;
+      todos.push(...response.data.todos);
+      cursor = response.data.next_cursor;
+    } while (cursor);
+    const data = { user_id: userId, todos };
+    if (etag) {
+      todoCache.set(userId, { etag, data });
+    }
+    return data;
   },
 
   // Start new chat (now returns job_id)
@@ -43,9 +67,29 @@ export const todoAPI = {
     return response.data;
   },
 
-  // Stream job results using SSE
-  streamJobResults: async (jobId, onMessage, onError, onComplete) => {
+  // Get the status of many jobs in one request
+  getJobStatuses: async (jobIds) => {
+    const response = await api.post('/jobs/status', { job_ids: jobIds });
+    return response.data;
+  },
+
+  // Long-poll until at least one of the jobs completes or fails;
+  // resolves with { jobs: [] } if none finished within the timeout
+  waitForJobs: async (jobIds, timeout = 25) => {
+    const response = await api.post('/jobs/status/wait', {
+      job_ids: jobIds,
+      timeout: timeout
+    });
+    return response.data;
+  },
+
+  // Stream job results using SSE.
+  // Chunk events carry only appended text plus its offset into the reply
+  // (see backend/stream_protocol.py); the reply is reassembled here and
+  // handed to onMessage as data.text.
+  streamJobResults: (jobId, onMessage, onError, onComplete) => {
     const eventSource = new EventSource(`${API_BASE_URL}/stream/${jobId}`);
+    let text = '';
     
     eventSource.onmessage = (event) => {
       try {
@@ -53,15 +97,26 @@ export const todoAPI = {
         
         switch (data.type) {
           case 'start':
-            onMessage(data);
+            text = '';
+            onMessage({ ...data, text });
             break;
           case 'chunk':
-            onMessage(data);
+            if (data.offset > text.length) {
+              console.warn(`Missed stream data: expected offset ${text.length}, got ${data.offset}`);
+            }
+            text = text.slice(0, data.offset) + data.delta;
+            onMessage({ ...data, text });
             break;
           case 'end':
+            text = data.content || text;
+            onMessage({ ...data, text });
+            // With deferred memory updates, memory_updated follows the reply
+            if (data.memory_update !== 'pending') eventSource.close();
+            if (onComplete) onComplete({ ...data, text });
+            break;
+          case 'memory_updated':
             onMessage(data);
             eventSource.close();
-            if (onComplete) onComplete(data);
             break;
           case 'error':
             if (onError) onError(data.error);
@@ -78,6 +133,12 @@ export const todoAPI = {
     };
 
     eventSource.onerror = (error) => {
+      if (eventSource.readyState === EventSource.CONNECTING) {
+        // The browser reconnects on its own and sends Last-Event-ID, so
+        // the server replays only the events we missed
+        console.warn('SSE connection lost, reconnecting...');
+        return;
+      }
       console.error('SSE connection error:', error);
       if (onError) onError('Connection error');
       eventSource.close();
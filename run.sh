@@ -17,7 +17,7 @@ EOF
 # Run worker in new Terminal window
 osascript <<EOF
 tell application "Terminal"
-    do script "cd \"$(pwd)/backend\" && source venv/bin/activate && export OBJC_DISABLE_INITIALIZE_FORK_SAFETY=YES && rq worker chat_jobs --url redis://localhost:6379"
+    do script "cd \"$(pwd)/backend\" && source venv/bin/activate && export OBJC_DISABLE_INITIALIZE_FORK_SAFETY=YES && python worker.py chat_jobs memory_jobs"
 end tell
 EOF
 
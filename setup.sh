@@ -84,10 +84,8 @@ EOF
 
 deactivate
 
-# --- SQLAlchemy migration for custom models ---
-cd ./db
-python migrate.py
-cd ..
+# --- Migrations: SQLAlchemy models, LangGraph store and checkpointer tables, indexes ---
+python -m db.migrate
 
 
 # --- Redis health check ---